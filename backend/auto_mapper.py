@@ -6,6 +6,11 @@ from difflib import SequenceMatcher
 from canonical_fields import CANONICAL_FIELDS
 from models_canonical import HeaderMapping
 
+# match_header results for the default field set, shared by every matcher;
+# the same export headers recur across files and uploads
+_DEFAULT_MATCH_CACHE: Dict[str, Optional[Tuple[str, float, str]]] = {}
+_MATCH_CACHE_MAX = 4096
+
 
 class HeaderMatcher:
     """Matches file headers to canonical fields using multiple strategies"""
@@ -13,6 +18,18 @@ class HeaderMatcher:
     def __init__(self, canonical_fields: Dict[str, List[str]] = None):
         self.canonical_fields = canonical_fields or CANONICAL_FIELDS
         
+        # Normalize synonyms once; exact matches become a dict lookup
+        self._synonyms_norm = {
+            field: [self.normalize_header(s) for s in synonyms]
+            for field, synonyms in self.canonical_fields.items()
+        }
+        self._exact_index: Dict[str, str] = {}
+        for field, synonyms in self._synonyms_norm.items():
+            for synonym_norm in synonyms:
+                self._exact_index.setdefault(synonym_norm, field)
+        
+        self._match_cache = _DEFAULT_MATCH_CACHE if canonical_fields is None else {}
+        
     def normalize_header(self, header: str) -> str:
         """Normalize header: lowercase, remove punctuation, trim"""
         if not header:
@@ -28,17 +45,14 @@ class HeaderMatcher:
     def exact_match(self, header: str, canonical_field: str) -> float:
         """Check for exact match"""
         header_norm = self.normalize_header(header)
-        for synonym in self.canonical_fields.get(canonical_field, []):
-            synonym_norm = self.normalize_header(synonym)
-            if header_norm == synonym_norm:
-                return 1.0
+        if header_norm in self._synonyms_norm.get(canonical_field, ()):
+            return 1.0
         return 0.0
     
     def substring_match(self, header: str, canonical_field: str) -> float:
         """Check if header or synonym is substring of the other"""
         header_norm = self.normalize_header(header)
-        for synonym in self.canonical_fields.get(canonical_field, []):
-            synonym_norm = self.normalize_header(synonym)
+        for synonym_norm in self._synonyms_norm.get(canonical_field, ()):
             if header_norm in synonym_norm or synonym_norm in header_norm:
                 # Higher score if longer match
                 shorter = min(len(header_norm), len(synonym_norm))
@@ -51,8 +65,7 @@ class HeaderMatcher:
         header_norm = self.normalize_header(header)
         best_score = 0.0
         
-        for synonym in self.canonical_fields.get(canonical_field, []):
-            synonym_norm = self.normalize_header(synonym)
+        for synonym_norm in self._synonyms_norm.get(canonical_field, ()):
             # Use SequenceMatcher for similarity
             ratio = SequenceMatcher(None, header_norm, synonym_norm).ratio()
             if ratio > best_score:
@@ -70,6 +83,23 @@ class HeaderMatcher:
         Returns:
             (canonical_field, confidence_score, match_type) or None
         """
+        try:
+            return self._match_cache[header]
+        except KeyError:
+            pass
+        
+        if len(self._match_cache) >= _MATCH_CACHE_MAX:
+            self._match_cache.clear()
+        match = self._match_cache[header] = self._match_header_uncached(header)
+        return match
+    
+    def _match_header_uncached(self, header: str) -> Optional[Tuple[str, float, str]]:
+        """Score a header against every canonical field"""
+        # An exact synonym hit always wins: nothing else can score 1.0
+        exact_field = self._exact_index.get(self.normalize_header(header))
+        if exact_field is not None:
+            return (exact_field, 1.0, "exact")
+        
         best_match = None
         best_score = 0.0
         best_type = None
@@ -3,8 +3,15 @@
 import re
 from typing import List, Dict, Tuple, Optional
 from collections import defaultdict
+from itertools import chain, islice
+import numpy as np
 from models_canonical import DocumentRange, DocumentType, NonSequentialDoc
 
+# Prefix (any chars) followed by a numeric suffix (1-12 digits)
+_PREFIX_NUMBER_RE = re.compile(r'^(.+?)(\d{1,12})$')
+
+CANCELLED_LIST_LIMIT = 100
+
 
 class InvoiceRangeDetector:
     """Detect invoice serial ranges and missing/cancelled documents"""
@@ -29,8 +36,7 @@ class InvoiceRangeDetector:
             "AB-2024-0042" -> ("AB-2024-", 42, 4)
             "XYZ123" -> ("XYZ", 123, 3)
         """
-        # Match prefix (any chars) followed by numeric suffix (1-12 digits)
-        match = re.match(r'^(.+?)(\d{1,12})$', invoice_no_norm)
+        match = _PREFIX_NUMBER_RE.match(invoice_no_norm)
         
         if match:
             prefix = match.group(1)
@@ -61,10 +67,15 @@ class InvoiceRangeDetector:
         Returns:
             (document_ranges, non_sequential_docs)
         """
-        # Group by document type and prefix
-        sequential_groups = defaultdict(lambda: defaultdict(list))
+        # Group by document type and prefix; a group holds distinct
+        # (number, pad_length) pairs, which is all range detection needs
+        sequential_groups = defaultdict(lambda: defaultdict(set))
         non_sequential_groups = defaultdict(list)
         
+        # Invoices span several lines (one per item): normalize and split
+        # each distinct invoice number once
+        split_cache = {}
+        
         for line in invoice_lines:
             invoice_no = line.get("invoice_no_raw", line.get("invoice_no", ""))
             doc_type_str = line.get("doc_type", "tax_invoice")
@@ -72,22 +83,17 @@ class InvoiceRangeDetector:
             if not invoice_no:
                 continue
             
-            # Normalize
-            invoice_no_norm = self.normalize_invoice_no(invoice_no)
-            
-            # Try to split into prefix and number
-            split_result = self.split_prefix_number(invoice_no_norm)
+            try:
+                split_result = split_cache[invoice_no]
+            except KeyError:
+                split_result = split_cache[invoice_no] = self.split_prefix_number(
+                    self.normalize_invoice_no(invoice_no)
+                )
             
             if split_result:
                 prefix, number, pad_length = split_result
                 # Store in sequential group
-                sequential_groups[doc_type_str][prefix].append({
-                    "raw": invoice_no,
-                    "norm": invoice_no_norm,
-                    "prefix": prefix,
-                    "number": number,
-                    "pad": pad_length
-                })
+                sequential_groups[doc_type_str][prefix].add((number, pad_length))
             else:
                 # Non-sequential
                 non_sequential_groups[doc_type_str].append(invoice_no)
@@ -96,47 +102,34 @@ class InvoiceRangeDetector:
         document_ranges = []
         
         for doc_type_str, prefix_groups in sequential_groups.items():
-            for prefix, invoices in prefix_groups.items():
-                # Sort by number
-                invoices_sorted = sorted(invoices, key=lambda x: x["number"])
-                
-                if not invoices_sorted:
+            for prefix, serials in prefix_groups.items():
+                if not serials:
                     continue
                 
-                # Get unique numbers
-                numbers = sorted(set(inv["number"] for inv in invoices_sorted))
+                # Unique serials, sorted (suffixes have at most 12 digits)
+                numbers = np.unique(np.fromiter(
+                    (number for number, _ in serials), dtype=np.int64, count=len(serials)
+                ))
                 
-                first_serial = numbers[0]
-                last_serial = numbers[-1]
+                first_serial = int(numbers[0])
+                last_serial = int(numbers[-1])
                 found_count = len(numbers)
                 expected_count = last_serial - first_serial + 1
                 
-                # Find missing numbers (cancelled)
-                cancelled_list = []
-                cancelled_ranges = []
-                
-                for i in range(first_serial, last_serial + 1):
-                    if i not in numbers:
-                        cancelled_list.append(i)
-                
-                # Compress cancelled list into ranges
-                if cancelled_list:
-                    range_start = cancelled_list[0]
-                    range_end = cancelled_list[0]
-                    
-                    for num in cancelled_list[1:]:
-                        if num == range_end + 1:
-                            range_end = num
-                        else:
-                            cancelled_ranges.append({"start": range_start, "end": range_end})
-                            range_start = num
-                            range_end = num
-                    
-                    # Add last range
-                    cancelled_ranges.append({"start": range_start, "end": range_end})
+                # Missing numbers (cancelled) are the gaps between consecutive serials
+                gaps = np.flatnonzero(np.diff(numbers) > 1)
+                gap_starts = (numbers[gaps] + 1).tolist()
+                gap_ends = (numbers[gaps + 1] - 1).tolist()
+                cancelled_ranges = [
+                    {"start": start, "end": end} for start, end in zip(gap_starts, gap_ends)
+                ]
+                cancelled_list = list(islice(
+                    chain.from_iterable(range(start, end + 1) for start, end in zip(gap_starts, gap_ends)),
+                    CANCELLED_LIST_LIMIT
+                ))
                 
                 # Get pad length (use most common or max)
-                pad_length = max(inv["pad"] for inv in invoices_sorted)
+                pad_length = max(pad for _, pad in serials)
                 
                 # Format doc_from and doc_to
                 doc_from = self.format_serial(prefix, first_serial, pad_length)
@@ -157,8 +150,8 @@ class InvoiceRangeDetector:
                     last_serial=last_serial,
                     found_count=found_count,
                     expected_count=expected_count,
-                    cancelled_count=len(cancelled_list),
-                    cancelled_list=cancelled_list[:100],  # Limit to first 100
+                    cancelled_count=expected_count - found_count,
+                    cancelled_list=cancelled_list,  # Limited to first CANCELLED_LIST_LIMIT
                     cancelled_ranges=cancelled_ranges,
                     doc_from=doc_from,
                     doc_to=doc_to
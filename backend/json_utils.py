@@ -2,10 +2,18 @@
 Custom JSON encoder to handle special float values (NaN, Infinity) and datetime objects
 """
 import json
-import math
+from decimal import Decimal
 from typing import Any
 from datetime import datetime, date
 
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 def sanitize_value(value: Any) -> Any:
     """
     Convert non-JSON-serializable values to JSON-compatible types
@@ -14,7 +22,8 @@ def sanitize_value(value: Any) -> Any:
     - date to ISO format string
     """
     if isinstance(value, float):
-        if math.isnan(value) or math.isinf(value):
+        # NaN is the only value unequal to itself; inf - inf is NaN
+        if value != value or value - value != 0.0:
             return None
         return value
     elif isinstance(value, datetime):
@@ -50,3 +59,30 @@ def safe_json_response(data: Any) -> dict:
     elif isinstance(data, list):
         return [sanitize_dict(item) if isinstance(item, dict) else sanitize_value(item) for item in data]
     return data
+
+def _orjson_default(value: Any) -> Any:
+    """
+    Fallback for types orjson does not serialize natively
+    """
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+def fast_json_response(data: Any) -> Response:
+    """
+    Serialize a large payload in one orjson pass instead of sanitizing it
+    in Python and then running FastAPI's encoder over it again
+
+    Output matches safe_json_response: NaN/Infinity become null and
+    dates/datetimes become ISO strings.
+    """
+    if not HAS_ORJSON:
+        return JSONResponse(safe_json_response(data))
+    return Response(
+        content=orjson.dumps(
+            data,
+            default=_orjson_default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ),
+        media_type="application/json"
+    )
@@ -1,8 +1,30 @@
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
 import uuid
+import itertools
+import os
+import secrets
+
+
+# Per-process random prefix + counter for high-volume row IDs: unique across
+# processes without paying a urandom read for every parsed line
+_ID_PREFIX = secrets.token_hex(8)
+_id_counter = itertools.count()
+
+
+def _reseed_fast_id():
+    global _ID_PREFIX, _id_counter
+    _ID_PREFIX = secrets.token_hex(8)
+    _id_counter = itertools.count()
+
+
+os.register_at_fork(after_in_child=_reseed_fast_id)
+
+
+def _fast_id() -> str:
+    return f"{_ID_PREFIX}{next(_id_counter):012x}"
 
 
 class FileType(str, Enum):
@@ -42,7 +64,7 @@ class Upload(BaseModel):
 class InvoiceLine(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_fast_id)
     upload_id: str
     file_type: FileType
     
@@ -71,6 +93,10 @@ class InvoiceLine(BaseModel):
     raw_data: Dict[str, Any] = {}
 
 
+# Compiled once at import; dumps a whole list of lines in a single pass
+INVOICE_LINE_LIST_ADAPTER = TypeAdapter(List[InvoiceLine])
+
+
 class Table7Entry(BaseModel):
     """B2C Others - Table 7 for GSTR-1B"""
     pos: str  # Place of supply (state code)
@@ -1,12 +1,14 @@
 """Canonical data models for schema-driven GSTR-1 generation"""
 
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 from enum import Enum
 import uuid
 from decimal import Decimal
 
+from models import _fast_id
+
 
 class FileType(str, Enum):
     TCS_SALES = "tcs_sales"
@@ -99,7 +101,7 @@ class CanonicalInvoiceLine(BaseModel):
     """
     model_config = ConfigDict(extra="ignore", arbitrary_types_allowed=True)
     
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=_fast_id)
     upload_id: str
     
     # Core identification
@@ -150,6 +152,10 @@ class CanonicalInvoiceLine(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+# Compiled once at import; dumps a whole list of lines in a single pass
+CANONICAL_INVOICE_LINE_LIST_ADAPTER = TypeAdapter(List[CanonicalInvoiceLine])
+
+
 class DocumentRange(BaseModel):
     """Document serial range for Table 13"""
     model_config = ConfigDict(extra="ignore")
@@ -3,6 +3,7 @@ MongoDB client as fallback when Supabase is not configured
 """
 import os
 import logging
+import gridfs
 from pymongo import MongoClient
 from typing import Optional, List, Dict, Any
 from datetime import datetime
@@ -22,6 +23,13 @@ except Exception as e:
     raise
 
 
+def _projection(columns: str) -> Optional[Dict[str, int]]:
+    """Mongo projection for a PostgREST-style comma-separated column list"""
+    if columns == '*':
+        return None
+    return {"_id": 0, **{column: 1 for column in columns.split(',')}}
+
+
 class MongoUploads:
     """MongoDB collection wrapper for uploads"""
     
@@ -55,20 +63,38 @@ class MongoInvoiceLines:
     def __init__(self):
         self.collection = db["invoice_lines"]
     
-    async def insert_many(self, documents: List[Dict], user_id: str = "default_user"):
-        """Insert multiple invoice lines"""
+    async def insert_many(self, documents: List[Dict], user_id: str = "default_user", ordered: bool = True):
+        """Insert multiple invoice lines (ordered=False lets the server continue past bad docs)"""
         for doc in documents:
             doc["user_id"] = user_id
         if documents:
-            self.collection.insert_many(documents)
+            self.collection.insert_many(documents, ordered=ordered)
     
-    async def find_by_upload(self, upload_id: str):
-        """Find invoice lines by upload ID"""
-        return list(self.collection.find({"upload_id": upload_id}))
+    async def find_by_upload(self, upload_id: str, columns: str = '*'):
+        """Find invoice lines by upload ID, optionally only some fields"""
+        return list(self.collection.find({"upload_id": upload_id}, _projection(columns)))
     
     async def count(self, upload_id: str):
         """Count invoice lines for upload"""
         return self.collection.count_documents({"upload_id": upload_id})
+    
+    async def aggregate_preview(self, upload_id: str):
+        """Per-section line counts and amount totals, grouped server-side"""
+        return list(self.collection.aggregate([
+            {"$match": {"upload_id": upload_id}},
+            {"$group": {
+                "_id": "$gstr_section",
+                "count": {"$sum": 1},
+                "taxable_value": {"$sum": "$taxable_value"},
+                "cgst_amount": {"$sum": "$computed_tax.cgst_amount"},
+                "sgst_amount": {"$sum": "$computed_tax.sgst_amount"},
+                "igst_amount": {"$sum": "$computed_tax.igst_amount"},
+            }},
+            {"$project": {
+                "_id": 0, "gstr_section": "$_id", "count": 1, "taxable_value": 1,
+                "cgst_amount": 1, "sgst_amount": 1, "igst_amount": 1
+            }},
+        ]))
 
 
 class MongoGSTRExports:
@@ -83,9 +109,9 @@ class MongoGSTRExports:
         result = self.collection.insert_one(data)
         return str(result.inserted_id)
     
-    async def find_by_upload(self, upload_id: str):
-        """Find exports by upload ID"""
-        return list(self.collection.find({"upload_id": upload_id}))
+    async def find_by_upload(self, upload_id: str, columns: str = '*'):
+        """Find exports by upload ID, optionally only some fields"""
+        return list(self.collection.find({"upload_id": upload_id}, _projection(columns)))
 
 
 class MongoDocumentRanges:
@@ -114,12 +140,20 @@ class MockAuth:
         return {"user": {"id": "mock_user", "email": email}, "session": {"access_token": "mock_token"}}
 
 
-class MockStorage:
-    """Mock storage for when Supabase is not available"""
+class GridFSStorage:
+    """Raw upload storage in a MongoDB GridFS bucket"""
+    
+    def __init__(self):
+        self.fs = gridfs.GridFS(db, collection="raw_files")
+    
+    def upload_file(self, path: str, content: bytes, user_id: str, content_type: str = "application/octet-stream"):
+        """Store file bytes under path (latest version wins on re-upload)"""
+        self.fs.put(content, filename=path, user_id=user_id, content_type=content_type)
+        return {"path": path, "url": f"gridfs://raw_files/{path}", "size": len(content)}
     
-    def upload_file(self, path: str, content: bytes, user_id: str, content_type: str):
-        # Just return success - data will be stored in MongoDB
-        return {"path": path, "url": f"mock://storage/{path}"}
+    def download_file(self, path: str) -> bytes:
+        """Read back the latest bytes stored under path"""
+        return self.fs.get_last_version(path).read()
 
 
 # Export instances
@@ -128,6 +162,6 @@ invoice_lines_collection = MongoInvoiceLines()
 gstr_exports_collection = MongoGSTRExports()
 document_ranges_collection = MongoDocumentRanges()
 auth = MockAuth()
-storage = MockStorage()
+storage = GridFSStorage()
 
 logger.info("✅ MongoDB collections initialized")
@@ -1,15 +1,44 @@
 import io
+import logging
+import math
+import multiprocessing
+import sys
 import zipfile
-from typing import List, Dict, BinaryIO, Tuple
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, BinaryIO, Tuple, Optional, Union
+import numpy as np
 import pandas as pd
 from models import FileType, FileInfo, InvoiceLine
 from utils import (
     detect_file_type,
     normalize_state_to_code,
-    compute_tax_split,
-    clean_numeric_value,
-    validate_gst_rate
+    clean_numeric_series,
+    VALID_GST_RATES
 )
+from parser_kernels import compute_tax_split_bulk
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    logger.warning("⚠️ pyarrow not available, using default CSV engine")
+    HAS_PYARROW = False
+
+# Free-text Meesho columns read as str up front so the CSV reader skips
+# type inference on them (matched like the parse_* column lookups)
+TEXT_COLUMN_KEYS = ('endcustomerstate', 'type', 'invoiceno')
+
+# Invoice lines keep only their source file name and DataFrame index label
+# instead of re-encoding the row as a dict; the original file is already
+# stored with the upload, so the row is recoverable with df.loc[row_index]
+RAW_SOURCE_FILE_KEY = 'source_file'
+RAW_ROW_INDEX_KEY = 'row_index'
+
+# Threads used to inflate ZIP members; zlib releases the GIL while decompressing
+ZIP_MAX_WORKERS = 8
 
 
 class FileParser:
@@ -18,70 +47,83 @@ class FileParser:
     def __init__(self, seller_state_code: str = "27"):  # Default: Maharashtra
         self.seller_state_code = seller_state_code
     
-    def extract_files_from_zip(self, zip_content: bytes) -> List[Tuple[str, bytes]]:
-        """Extract all Excel/CSV files from ZIP"""
-        files = []
+    def extract_files_from_zip(self, zip_content: Union[bytes, BinaryIO]) -> List[Tuple[str, bytes]]:
+        """
+        Extract all Excel/CSV files from ZIP
+        
+        Accepts the archive as bytes or as a seekable binary file, so a spooled
+        upload can be read in place without first loading it into memory.
+        """
+        if isinstance(zip_content, (bytes, bytearray)):
+            zip_content = io.BytesIO(zip_content)
         
         try:
-            with zipfile.ZipFile(io.BytesIO(zip_content)) as zf:
-                for filename in zf.namelist():
-                    # Skip directories and hidden files
-                    if filename.endswith('/') or filename.startswith('__MACOSX') or filename.startswith('.'):
-                        continue
-                    
-                    # Only process Excel and CSV files
-                    if filename.lower().endswith(('.xlsx', '.xls', '.csv')):
-                        file_content = zf.read(filename)
-                        files.append((filename, file_content))
+            with zipfile.ZipFile(zip_content) as zf:
+                filenames = [
+                    filename for filename in zf.namelist()
+                    # Skip directories and hidden files; only Excel and CSV files are processed
+                    if not (filename.endswith('/') or filename.startswith('__MACOSX') or filename.startswith('.'))
+                    and filename.lower().endswith(('.xlsx', '.xls', '.csv'))
+                ]
+                if len(filenames) < 2:
+                    return [(filename, zf.read(filename)) for filename in filenames]
+                
+                # Members share the archive's file object only for the raw read;
+                # decompression runs concurrently across the pool
+                with ThreadPoolExecutor(max_workers=min(ZIP_MAX_WORKERS, len(filenames))) as executor:
+                    return list(zip(filenames, executor.map(zf.read, filenames)))
         except zipfile.BadZipFile:
             raise ValueError("Invalid ZIP file")
-        
-        return files
     
     def read_excel_file(self, file_content: bytes, filename: str) -> pd.DataFrame:
         """Read Excel or CSV file into DataFrame"""
         try:
             if filename.lower().endswith('.csv'):
-                df = pd.read_csv(io.BytesIO(file_content))
+                df = self._read_csv(file_content)
             else:
                 df = pd.read_excel(io.BytesIO(file_content), engine='openpyxl')
             
+            # Intern header names once; every parser matches against them
+            df.columns = [sys.intern(c) if isinstance(c, str) else c for c in df.columns]
             return df
         except Exception as e:
             raise ValueError(f"Error reading file {filename}: {str(e)}")
     
+    def _read_csv(self, file_content: bytes) -> pd.DataFrame:
+        """Read CSV with the multithreaded pyarrow engine when available"""
+        if not HAS_PYARROW:
+            return pd.read_csv(io.BytesIO(file_content))
+        
+        # Sniff headers first so known text columns skip dtype inference
+        columns = pd.read_csv(io.BytesIO(file_content), nrows=0).columns
+        dtype = {
+            col: str for col in columns
+            if any(key in col.lower().replace('_', '').replace(' ', '').replace('.', '')
+                   for key in TEXT_COLUMN_KEYS)
+        }
+        
+        try:
+            return pd.read_csv(io.BytesIO(file_content), engine='pyarrow', dtype=dtype)
+        except Exception as e:
+            # pyarrow is stricter about malformed rows/encodings than the C engine
+            logger.warning(f"⚠️ pyarrow CSV read failed ({e}), retrying with default engine")
+            return pd.read_csv(io.BytesIO(file_content), dtype=dtype)
+    
     def detect_and_classify_files(self, files: List[Tuple[str, bytes]]) -> List[Dict]:
         """Detect file types and extract basic info"""
-        classified_files = []
+        if len(files) < 2:
+            return [classify_file(filename, content) for filename, content in files]
         
-        for filename, content in files:
-            try:
-                df = self.read_excel_file(content, filename)
-                columns = df.columns.tolist()
-                
-                file_type = detect_file_type(filename, columns)
-                
-                file_info = {
-                    "filename": filename,
-                    "file_type": file_type.value,
-                    "detected": file_type != FileType.UNKNOWN,
-                    "row_count": len(df),
-                    "columns": columns,
-                    "content": content
-                }
-                
-                classified_files.append(file_info)
-            except Exception as e:
-                classified_files.append({
-                    "filename": filename,
-                    "file_type": FileType.UNKNOWN.value,
-                    "detected": False,
-                    "error": str(e)
-                })
-        
-        return classified_files
+        # Files are independent and CPU-bound to decode: classify them in
+        # worker processes and re-attach content here instead of pickling it back
+        infos = list(get_process_pool().map(_classify_file_info, files))
+        for info, (_, content) in zip(infos, files):
+            if "error" not in info:
+                info["content"] = content
+        return infos
     
-    def parse_tcs_sales(self, df: pd.DataFrame, upload_id: str, is_return: bool = False) -> List[InvoiceLine]:
+    def parse_tcs_sales(self, df: pd.DataFrame, upload_id: str, is_return: bool = False,
+                        source_file: Optional[str] = None) -> List[InvoiceLine]:
         """Parse TCS sales or sales return file"""
         invoice_lines = []
         
@@ -105,20 +147,29 @@ class FileParser:
         if missing_cols:
             raise ValueError(f"Missing required columns: {', '.join(missing_cols)}")
         
-        # Parse each row
-        for idx, row in df.iterrows():
+        # Resolve column positions once; rows are then read as plain tuples
+        i_rate, i_tv, i_state = [
+            df.columns.get_loc(required_cols[k])
+            for k in ('gst_rate', 'total_taxable_sale_value', 'end_customer_state_new')
+        ]
+        
+        # Clean the numeric columns a whole column at a time
+        gst_rates = clean_numeric_series(df.iloc[:, i_rate]).tolist()
+        taxable_values = clean_numeric_series(df.iloc[:, i_tv]).tolist()
+        state_names = df.iloc[:, i_state].tolist()
+        
+        # First pass: validate rows and collect the numeric columns
+        rows = []
+        for idx, gst_rate, taxable_value, state_raw in zip(df.index, gst_rates, taxable_values, state_names):
             try:
-                # Extract values
-                gst_rate = clean_numeric_value(row.get(required_cols['gst_rate']))
-                taxable_value = clean_numeric_value(row.get(required_cols['total_taxable_sale_value']))
-                state_name = str(row.get(required_cols['end_customer_state_new'], '')).strip()
+                state_name = sys.intern(str(state_raw).strip())
                 
                 # Skip rows with missing critical data
-                if gst_rate is None or taxable_value is None or not state_name:
+                if math.isnan(gst_rate) or math.isnan(taxable_value) or not state_name:
                     continue
                 
                 # Validate GST rate
-                if not validate_gst_rate(gst_rate):
+                if gst_rate not in VALID_GST_RATES:
                     continue
                 
                 # Normalize state
@@ -126,24 +177,41 @@ class FileParser:
                 if not state_code:
                     continue
                 
-                # Apply negative for returns
-                if is_return:
-                    taxable_value = -abs(taxable_value)
+                rows.append((idx, gst_rate, taxable_value, state_name, state_code))
                 
-                # Compute tax split
-                tax_split = compute_tax_split(
-                    abs(taxable_value),
-                    gst_rate,
-                    self.seller_state_code,
-                    state_code
-                )
+            except Exception as e:
+                # Log error but continue processing
+                continue
+        
+        if not rows:
+            return invoice_lines
+        
+        # Compute the tax split for the whole file in one kernel call
+        tax_split = compute_tax_split_bulk(
+            np.fromiter((abs(r[2]) for r in rows), dtype=np.float64, count=len(rows)),
+            np.fromiter((r[1] for r in rows), dtype=np.float64, count=len(rows)),
+            np.fromiter((r[4] == self.seller_state_code for r in rows), dtype=np.bool_, count=len(rows))
+        )
+        tax_amounts = tax_split['tax_amount'].tolist()
+        cgst_amounts = tax_split['cgst_amount'].tolist()
+        sgst_amounts = tax_split['sgst_amount'].tolist()
+        igst_amounts = tax_split['igst_amount'].tolist()
+        
+        # Second pass: build invoice lines
+        for i, (idx, gst_rate, taxable_value, state_name, state_code) in enumerate(rows):
+            try:
+                tax_amount = tax_amounts[i]
+                cgst_amount = cgst_amounts[i]
+                sgst_amount = sgst_amounts[i]
+                igst_amount = igst_amounts[i]
                 
-                # Adjust signs for returns
+                # Apply negative for returns
                 if is_return:
-                    tax_split['tax_amount'] = -abs(tax_split['tax_amount'])
-                    tax_split['cgst_amount'] = -abs(tax_split['cgst_amount'])
-                    tax_split['sgst_amount'] = -abs(tax_split['sgst_amount'])
-                    tax_split['igst_amount'] = -abs(tax_split['igst_amount'])
+                    taxable_value = -abs(taxable_value)
+                    tax_amount = -tax_amount
+                    cgst_amount = -cgst_amount
+                    sgst_amount = -sgst_amount
+                    igst_amount = -igst_amount
                 
                 # Create invoice line
                 invoice_line = InvoiceLine(
@@ -155,12 +223,12 @@ class FileParser:
                     state_code=state_code,
                     is_return=is_return,
                     taxable_value=taxable_value,
-                    tax_amount=tax_split['tax_amount'],
-                    cgst_amount=tax_split['cgst_amount'],
-                    sgst_amount=tax_split['sgst_amount'],
-                    igst_amount=tax_split['igst_amount'],
-                    is_intra_state=tax_split['is_intra_state'],
-                    raw_data=row.to_dict()
+                    tax_amount=tax_amount,
+                    cgst_amount=cgst_amount,
+                    sgst_amount=sgst_amount,
+                    igst_amount=igst_amount,
+                    is_intra_state=state_code == self.seller_state_code,
+                    raw_data={RAW_SOURCE_FILE_KEY: source_file, RAW_ROW_INDEX_KEY: int(idx)}
                 )
                 
                 invoice_lines.append(invoice_line)
@@ -171,7 +239,8 @@ class FileParser:
         
         return invoice_lines
     
-    def parse_tax_invoice(self, df: pd.DataFrame, upload_id: str) -> List[InvoiceLine]:
+    def parse_tax_invoice(self, df: pd.DataFrame, upload_id: str,
+                          source_file: Optional[str] = None) -> List[InvoiceLine]:
         """Parse tax invoice details file"""
         invoice_lines = []
         
@@ -189,11 +258,14 @@ class FileParser:
         if not type_col or not invoice_no_col:
             raise ValueError("Missing required columns: Type or Invoice No.")
         
+        i_type = df.columns.get_loc(type_col)
+        i_invoice_no = df.columns.get_loc(invoice_no_col)
+        
         # Parse each row
-        for idx, row in df.iterrows():
+        for idx, row in zip(df.index, df.itertuples(index=False, name=None)):
             try:
-                invoice_type = str(row.get(type_col, '')).strip()
-                invoice_no = str(row.get(invoice_no_col, '')).strip()
+                invoice_type = str(row[i_type]).strip()
+                invoice_no = str(row[i_invoice_no]).strip()
                 
                 if not invoice_type or not invoice_no:
                     continue
@@ -204,7 +276,7 @@ class FileParser:
                     file_type=FileType.TAX_INVOICE,
                     invoice_type=invoice_type,
                     invoice_no=invoice_no,
-                    raw_data=row.to_dict()
+                    raw_data={RAW_SOURCE_FILE_KEY: source_file, RAW_ROW_INDEX_KEY: int(idx)}
                 )
                 
                 invoice_lines.append(invoice_line)
@@ -216,13 +288,80 @@ class FileParser:
     
     def parse_file(self, file_content: bytes, filename: str, file_type: FileType, upload_id: str) -> List[InvoiceLine]:
         """Parse a single file based on its type"""
+        # Float columns stay float64 with NaN so clean_numeric_series can take
+        # its vectorized path; NaN/Infinity are only sanitized at the JSON boundary
         df = self.read_excel_file(file_content, filename)
         
         if file_type == FileType.TCS_SALES:
-            return self.parse_tcs_sales(df, upload_id, is_return=False)
+            return self.parse_tcs_sales(df, upload_id, is_return=False, source_file=filename)
         elif file_type == FileType.TCS_SALES_RETURN:
-            return self.parse_tcs_sales(df, upload_id, is_return=True)
+            return self.parse_tcs_sales(df, upload_id, is_return=True, source_file=filename)
         elif file_type == FileType.TAX_INVOICE:
-            return self.parse_tax_invoice(df, upload_id)
+            return self.parse_tax_invoice(df, upload_id, source_file=filename)
         else:
             raise ValueError(f"Unknown file type: {file_type}")
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Shared worker pool for per-file parsing, created on first use
+    
+    Uses the spawn start method, as parser_enhanced does, so workers are never
+    forked from a server process that already runs threads and HTTP pools.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def _classify_file_info(args: Tuple[str, bytes]) -> Dict:
+    """Worker entry point: classify one file, without echoing its content"""
+    filename, content = args
+    info = classify_file(filename, content)
+    info.pop("content", None)
+    return info
+
+
+def classify_file(filename: str, content: bytes) -> Dict:
+    """Detect the type of a single file and extract basic info"""
+    try:
+        df = FileParser().read_excel_file(content, filename)
+        columns = df.columns.tolist()
+        
+        file_type = detect_file_type(filename, columns)
+        
+        return {
+            "filename": filename,
+            "file_type": file_type.value,
+            "detected": file_type != FileType.UNKNOWN,
+            "row_count": len(df),
+            "columns": columns,
+            "content": content
+        }
+    except Exception as e:
+        return {
+            "filename": filename,
+            "file_type": FileType.UNKNOWN.value,
+            "detected": False,
+            "error": str(e)
+        }
+
+
+def parse_file_worker(
+    seller_state_code: str,
+    file_content: bytes,
+    filename: str,
+    file_type: FileType,
+    upload_id: str
+) -> List[InvoiceLine]:
+    """Worker entry point: parse one file in a pool process"""
+    return FileParser(seller_state_code=seller_state_code).parse_file(
+        file_content, filename, file_type, upload_id
+    )
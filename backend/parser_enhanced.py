@@ -2,24 +2,135 @@
 
 import openpyxl
 import csv
+import re
+import hashlib
 import io
+import multiprocessing
+import os
 import zipfile
-from typing import List, Dict, Tuple, Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+from operator import itemgetter
+from typing import List, Dict, Tuple, Optional, Iterator
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, date, timedelta
 import logging
 
+import numpy as np
+import pandas as pd
+
+from pydantic import ValidationError
+
 from models_canonical import (
     CanonicalInvoiceLine, FileType, DocumentType, GSTRSection,
-    HeaderMapping, FileInfo
+    HeaderMapping, FileInfo, CANONICAL_INVOICE_LINE_LIST_ADAPTER
 )
-from decimal_utils import parse_money, compute_tax
+from decimal_utils import parse_money, compute_tax, HUNDRED
+from parser_kernels import compute_signed_tax_split_paise
 from auto_mapper import HeaderMatcher
 from canonical_fields import CANONICAL_FIELDS, DOCUMENT_TYPES
-from utils import normalize_state_to_code
+from utils import STATE_CODE_MAPPING, normalize_state_to_code
 
 logger = logging.getLogger(__name__)
 
+try:
+    from python_calamine import CalamineWorkbook
+    HAS_CALAMINE = True
+except ImportError:
+    logger.warning("⚠️ python-calamine not available, reading Excel files with openpyxl")
+    HAS_CALAMINE = False
+
+
+# Invoice date fast paths: ISO (optionally with a time part) and Indian DD/MM/YYYY
+_DATE_ISO_RE = re.compile(r'^(\d{4}-\d{2}-\d{2})(?:[ T].*)?$')
+_DATE_DMY_RE = re.compile(r'^(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})$')
+
+# Excel's day-zero (1900 date system, including its 1900 leap-year quirk)
+EXCEL_EPOCH = datetime(1899, 12, 30)
+EXCEL_SERIAL_MIN = 1
+EXCEL_SERIAL_MAX = 2958465  # 9999-12-31
+
+# DEFLATE inflation stops scaling past a handful of threads
+ZIP_MAX_WORKERS = 8
+
+# Bounds that keep the integer tax kernel's paise * basis-point product in int64
+MAX_TAXABLE_PAISE = 10 ** 13
+MAX_RATE_BP = 10 ** 4
+
+B2CL_THRESHOLD = Decimal("250000")
+
+# DOCUMENT_TYPES keywords in priority order, with enum members pre-built;
+# the alternation only answers "does any keyword occur at all"
+_DOCUMENT_TYPE_RULES = tuple((key, DocumentType(value)) for key, value in DOCUMENT_TYPES.items())
+_DOCUMENT_TYPE_RE = re.compile("|".join(re.escape(key) for key in DOCUMENT_TYPES))
+
+# Filename keywords in priority order (first matching entry wins)
+_FILENAME_FILE_TYPES = (
+    (("tcs_sales_return", "sales_return"), FileType.TCS_SALES_RETURN),
+    (("tcs_sales",), FileType.TCS_SALES),
+    (("tax_invoice", "invoice_details"), FileType.TAX_INVOICE),
+    (("credit",), FileType.CREDIT_NOTE),
+    (("debit",), FileType.DEBIT_NOTE),
+    (("hsn",), FileType.HSN_SUMMARY),
+    (("b2b",), FileType.B2B_INVOICES),
+)
+_FILENAME_KEYWORD_RE = re.compile(
+    "|".join(re.escape(keyword) for keywords, _ in _FILENAME_FILE_TYPES for keyword in keywords)
+)
+
+
+_NONE = object()
+
+
+def _factorize(values: np.ndarray) -> Tuple[np.ndarray, list]:
+    """Integer codes plus distinct values, keeping None distinct from NaN"""
+    is_none = values == None  # noqa: E711 - elementwise on object arrays
+    if is_none.any():
+        values = values.copy()
+        values[is_none] = _NONE
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return codes, [None if u is _NONE else u for u in uniques]
+
+
+def _take(per_unique: list, codes: np.ndarray, dtype=object) -> np.ndarray:
+    """Broadcast per-distinct-value results back to rows"""
+    arr = np.empty(len(per_unique), dtype=dtype)
+    arr[:] = per_unique
+    return arr[codes]
+
+
+def _to_scaled_int(value: Decimal, limit: int) -> Optional[int]:
+    """value * 100 as an exact int, or None if it has more than 2 decimals or exceeds limit"""
+    if not value.is_finite() or value.as_tuple().exponent < -2:
+        return None
+    scaled = int(value.scaleb(2))
+    return scaled if abs(scaled) <= limit else None
+
+
+def _raw_tax(taxable: Decimal, rate: Decimal) -> Optional[Decimal]:
+    """Unrounded taxable * rate / 100, as compute_tax reports it"""
+    try:
+        return taxable * rate / HUNDRED
+    except ArithmeticError:
+        return None
+
+
+def _as_optional_str(value) -> Optional[str]:
+    """Text form of a cell for Optional[str] fields; None stays None"""
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+def _normalize_calamine_cell(value):
+    """Match openpyxl's values_only output: None for blanks, int for whole numbers"""
+    if value == "":
+        return None
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
 
 class EnhancedFileParser:
     """Enhanced parser with auto-mapping and canonical normalization"""
@@ -27,36 +138,102 @@ class EnhancedFileParser:
     def __init__(self, seller_state_code: str = "27"):
         self.seller_state_code = seller_state_code
         self.header_matcher = HeaderMatcher()
+        # Parsed rows per file content digest, so detect -> map -> parse
+        # decodes each upload once
+        self._file_cache: Dict[Tuple[bytes, bool], List[List]] = {}
+    
+    def clear_cache(self):
+        """Drop cached parsed files (call once an upload is done)"""
+        self._file_cache.clear()
     
-    def extract_files_from_zip(self, zip_content: bytes) -> List[Tuple[str, bytes]]:
-        """Extract files from ZIP archive"""
-        files = []
+    def release_file(self, content: bytes, filename: str):
+        """Drop one file's cached rows once nothing else will read them"""
+        self._file_cache.pop(self._cache_key(content, filename), None)
+    
+    @staticmethod
+    def _cache_key(content: bytes, filename: str) -> Tuple[bytes, bool]:
+        """Content digest plus the CSV flag (same bytes parse differently per format)"""
+        return (hashlib.blake2b(content, digest_size=16).digest(), filename.endswith('.csv'))
+    
+    def _get_rows(self, content: bytes, filename: str) -> List[List]:
+        """Parse a file once and return its cached rows, header row first"""
+        key = self._cache_key(content, filename)
+        rows = self._file_cache.get(key)
+        if rows is None:
+            if key[1]:
+                # Decode incrementally as the reader consumes, instead of
+                # materializing the whole file as one str first
+                text_stream = io.TextIOWrapper(io.BytesIO(content), encoding='utf-8-sig', newline='')
+                rows = list(csv.reader(text_stream))
+            else:
+                rows = self._read_excel_rows(content)
+            self._file_cache[key] = rows
+        return rows
+    
+    def extract_files_from_zip(self, zip_content: bytes) -> Iterator[Tuple[str, bytes]]:
+        """
+        Yield files from a ZIP archive one at a time
+        
+        Members are inflated on a small thread pool (zlib releases the GIL)
+        a bounded window ahead of the consumer, so only a few decompressed
+        files are held in memory rather than the whole archive's contents.
+        """
         try:
-            with zipfile.ZipFile(io.BytesIO(zip_content)) as zf:
-                for filename in zf.namelist():
-                    if filename.endswith(('.xlsx', '.xls', '.csv')) and not filename.startswith('__MACOSX'):
-                        content = zf.read(filename)
-                        files.append((filename, content))
+            zf = zipfile.ZipFile(io.BytesIO(zip_content))
         except Exception as e:
             logger.error(f"Error extracting ZIP: {str(e)}")
-        return files
+            return
+        
+        with zf:
+            members = iter([
+                filename for filename in zf.namelist()
+                if filename.endswith(('.xlsx', '.xls', '.csv')) and not filename.startswith('__MACOSX')
+            ])
+            
+            with ThreadPoolExecutor(max_workers=ZIP_MAX_WORKERS) as executor:
+                pending = deque(
+                    (filename, executor.submit(zf.read, filename))
+                    for filename in islice(members, ZIP_MAX_WORKERS)
+                )
+                while pending:
+                    filename, future = pending.popleft()
+                    next_member = next(members, None)
+                    if next_member is not None:
+                        pending.append((next_member, executor.submit(zf.read, next_member)))
+                    
+                    try:
+                        content = future.result()
+                    except Exception as e:
+                        logger.error(f"Error extracting {filename} from ZIP: {str(e)}")
+                        continue
+                    # Yield outside the try so caller errors are not swallowed here
+                    yield filename, content
+    
+    def _open_first_sheet(self, content: bytes):
+        """Open the first worksheet with the Rust-backed calamine reader"""
+        return CalamineWorkbook.from_filelike(io.BytesIO(content)).get_sheet_by_index(0)
+    
+    def _read_excel_rows(self, content: bytes) -> List[List]:
+        """Read worksheet rows as lists of primitives, calamine first, openpyxl as fallback"""
+        if HAS_CALAMINE:
+            try:
+                sheet_rows = self._open_first_sheet(content).to_python(skip_empty_area=False)
+                return [[_normalize_calamine_cell(v) for v in row] for row in sheet_rows]
+            except Exception as e:
+                logger.warning(f"⚠️ calamine could not read workbook ({e}), falling back to openpyxl")
+        
+        wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            return [list(row) for row in ws.iter_rows(values_only=True)]
+        finally:
+            wb.close()
     
     def read_headers(self, content: bytes, filename: str) -> Optional[List[str]]:
         """Read first row headers from file"""
         try:
-            if filename.endswith('.csv'):
-                # CSV file
-                text = content.decode('utf-8-sig')
-                reader = csv.reader(io.StringIO(text))
-                headers = next(reader)
-                return [h.strip() for h in headers]
-            else:
-                # Excel file
-                wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
-                ws = wb.active
-                headers = [cell.value for cell in next(ws.iter_rows(min_row=1, max_row=1))]
-                wb.close()
-                return [str(h).strip() if h else "" for h in headers]
+            headers = self._get_rows(content, filename)[0]
+            return [str(h).strip() if h else "" for h in headers]
         except Exception as e:
             logger.error(f"Error reading headers from {filename}: {str(e)}")
             return None
@@ -116,20 +293,10 @@ class EnhancedFileParser:
         filename_lower = filename.lower()
         
         # Check filename patterns
-        if "tcs_sales_return" in filename_lower or "sales_return" in filename_lower:
-            return FileType.TCS_SALES_RETURN
-        elif "tcs_sales" in filename_lower:
-            return FileType.TCS_SALES
-        elif "tax_invoice" in filename_lower or "invoice_details" in filename_lower:
-            return FileType.TAX_INVOICE
-        elif "credit_note" in filename_lower or "credit" in filename_lower:
-            return FileType.CREDIT_NOTE
-        elif "debit_note" in filename_lower or "debit" in filename_lower:
-            return FileType.DEBIT_NOTE
-        elif "hsn" in filename_lower:
-            return FileType.HSN_SUMMARY
-        elif "b2b" in filename_lower:
-            return FileType.B2B_INVOICES
+        if _FILENAME_KEYWORD_RE.search(filename_lower):
+            for keywords, keyword_file_type in _FILENAME_FILE_TYPES:
+                if any(keyword in filename_lower for keyword in keywords):
+                    return keyword_file_type
         
         # Check by suggested section
         if suggested_section:
@@ -145,15 +312,7 @@ class EnhancedFileParser:
     def _count_rows(self, content: bytes, filename: str) -> int:
         """Count rows in file"""
         try:
-            if filename.endswith('.csv'):
-                text = content.decode('utf-8-sig')
-                return len(text.splitlines()) - 1  # Exclude header
-            else:
-                wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True)
-                ws = wb.active
-                count = ws.max_row - 1  # Exclude header
-                wb.close()
-                return count
+            return max(len(self._get_rows(content, filename)) - 1, 0)  # Exclude header
         except:
             return 0
     
@@ -184,157 +343,279 @@ class EnhancedFileParser:
             # Read all rows
             rows = self._read_all_rows(content, filename)
             
-            if not rows:
+            if len(rows) < 2:
                 return lines
             
             headers = rows[0]
             data_rows = rows[1:]
             
-            # Create reverse mapping: canonical_field -> file_header
-            canonical_to_file = {m.canonical_field: file_header for file_header, m in mappings.items()}
+            # Column position per canonical field; unmapped headers keep their
+            # own name, and a later duplicate header wins as in a row dict
+            last_col = {header: i for i, header in enumerate(headers)}
+            field_cols = {}
+            for file_header, i in last_col.items():
+                if file_header in mappings:
+                    field_cols[mappings[file_header].canonical_field] = i
+                else:
+                    field_cols[file_header] = i
             
-            for row_idx, row_data in enumerate(data_rows):
-                try:
-                    # Build row dict with canonical field names
-                    row = {}
-                    for i, header in enumerate(headers):
-                        if i < len(row_data):
-                            row[header] = row_data[i]
-                    
-                    # Map to canonical fields
-                    canonical_row = {}
-                    for file_header, value in row.items():
-                        if file_header in mappings:
-                            canonical_field = mappings[file_header].canonical_field
-                            canonical_row[canonical_field] = value
-                        else:
-                            canonical_row[file_header] = value  # Keep unmapped fields
-                    
-                    # Parse into CanonicalInvoiceLine
-                    invoice_line = self._parse_row_to_canonical(
-                        canonical_row,
-                        upload_id,
-                        file_type,
-                        row
-                    )
-                    
-                    if invoice_line:
-                        lines.append(invoice_line)
-                
-                except Exception as e:
-                    logger.error(f"Error parsing row {row_idx} in {filename}: {str(e)}")
-                    continue
+            lines = self._parse_columns_to_canonical(
+                headers, data_rows, field_cols, upload_id, file_type, filename
+            )
         
         except Exception as e:
             logger.error(f"Error parsing file {filename}: {str(e)}")
         
         return lines
     
-    def _read_all_rows(self, content: bytes, filename: str) -> List[List]:
-        """Read all rows from file"""
-        rows = []
+    def _parse_columns_to_canonical(
+        self,
+        headers: List,
+        data_rows: List[List],
+        field_cols: Dict[str, int],
+        upload_id: str,
+        file_type: FileType,
+        filename: str
+    ) -> List[CanonicalInvoiceLine]:
+        """
+        Normalize all rows column-at-a-time and build CanonicalInvoiceLines
         
-        try:
-            if filename.endswith('.csv'):
-                text = content.decode('utf-8-sig')
-                reader = csv.reader(io.StringIO(text))
-                rows = list(reader)
+        Per-value work (money parsing, state lookup, dates, document type)
+        runs once per distinct value; the tax split is one integer NumPy pass
+        that matches decimal_utils.compute_tax exactly.
+        """
+        n = len(data_rows)
+        # Columns every row reaches can be pulled with a C-level itemgetter
+        min_width = min(map(len, data_rows))
+        
+        def column(field: str, default=None) -> np.ndarray:
+            values = np.empty(n, dtype=object)
+            i = field_cols.get(field)
+            if i is None:
+                values[:] = [default] * n
+            elif i < min_width:
+                values[:] = list(map(itemgetter(i), data_rows))
             else:
-                wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
-                ws = wb.active
-                for row in ws.iter_rows(values_only=True):
-                    rows.append(list(row))
-                wb.close()
-        except Exception as e:
-            logger.error(f"Error reading rows from {filename}: {str(e)}")
+                values[:] = [r[i] if i < len(r) else default for r in data_rows]
+            return values
         
-        return rows
+        # Invoice numbers
+        inv_codes, inv_uniques = _factorize(column("invoice_no", ""))
+        inv_raw_u = ["" if v is None else str(v).strip() for v in inv_uniques]
+        inv_raw = _take(inv_raw_u, inv_codes)
+        inv_norm = _take([v.upper() for v in inv_raw_u], inv_codes)
+        has_invoice_no = _take([bool(v) for v in inv_raw_u], inv_codes, np.bool_)
+        
+        # Taxable value: Decimal, finiteness and exact paise per distinct value
+        tv_codes, tv_uniques = _factorize(column("taxable_value", 0))
+        tv_dec_u = [parse_money(v) for v in tv_uniques]
+        tv_finite = _take([d.is_finite() for d in tv_dec_u], tv_codes, np.bool_)
+        tv_paise_u = [_to_scaled_int(d, MAX_TAXABLE_PAISE) for d in tv_dec_u]
+        tv_fits = _take([p is not None for p in tv_paise_u], tv_codes, np.bool_)
+        tv_paise = _take([p or 0 for p in tv_paise_u], tv_codes, np.int64)
+        tv_negative = _take([d.is_finite() and d < 0 for d in tv_dec_u], tv_codes, np.bool_)
+        tv_positive = _take([d.is_finite() and d > 0 for d in tv_dec_u], tv_codes, np.bool_)
+        tv_b2cl = _take([d.is_finite() and d > B2CL_THRESHOLD for d in tv_dec_u], tv_codes, np.bool_)
+        
+        # GST rate
+        rate_codes, rate_uniques = _factorize(column("gst_rate", 0))
+        rate_dec_u = [parse_money(v) for v in rate_uniques]
+        rate_dec = _take(rate_dec_u, rate_codes)
+        rate_bp_u = [_to_scaled_int(d, MAX_RATE_BP) for d in rate_dec_u]
+        rate_fits = _take([p is not None for p in rate_bp_u], rate_codes, np.bool_)
+        rate_bp = _take([p or 0 for p in rate_bp_u], rate_codes, np.int64)
+        
+        # Returns are negated once, up front
+        is_return = tv_negative | (file_type == FileType.TCS_SALES_RETURN)
+        negate = is_return & tv_positive
+        tv_paise = np.where(negate, -tv_paise, tv_paise)
+        
+        # Decimal-derived fields once per distinct signed value / value-rate pair
+        signed_codes, signed_uniques = _factorize(tv_codes.astype(np.int64) * 2 + negate)
+        signed_dec_u = [-tv_dec_u[c // 2] if c % 2 else tv_dec_u[c // 2] for c in signed_uniques]
+        tv_dec = _take(signed_dec_u, signed_codes)
+        taxable_raw = _take([str(d) for d in signed_dec_u], signed_codes).tolist()
+        taxable_float = _take([float(d) if d.is_finite() else None for d in signed_dec_u], signed_codes).tolist()
+        rate_float_u = [None if d.is_snan() else float(d) for d in rate_dec_u]
+        rate_float = _take(rate_float_u, rate_codes).tolist()
+        rate_ok = _take([f is not None for f in rate_float_u], rate_codes, np.bool_)
+        
+        n_rates = len(rate_uniques)
+        pair_codes, pair_uniques = _factorize(signed_codes.astype(np.int64) * n_rates + rate_codes)
+        tax_raw = _take(
+            [_raw_tax(signed_dec_u[p // n_rates], rate_dec_u[p % n_rates]) for p in pair_uniques],
+            pair_codes
+        ).tolist()
+        
+        # Place of supply
+        pos_state = column("place_of_supply", "")
+        pos_codes, pos_uniques = _factorize(pos_state)
+        pos_code_u = []
+        state_get = STATE_CODE_MAPPING.get
+        for state in pos_uniques:
+            # Exact names resolve with one dict probe; aliases and partial
+            # names still go through normalize_state_to_code
+            code = state_get(state.strip().lower()) if isinstance(state, str) else None
+            if code is None:
+                try:
+                    code = normalize_state_to_code(state) or self.seller_state_code
+                except Exception:
+                    code = None
+            pos_code_u.append(code)
+        pos_code = _take(pos_code_u, pos_codes)
+        pos_ok = _take([c is not None for c in pos_code_u], pos_codes, np.bool_)
+        is_intra = pos_code == self.seller_state_code
+        
+        # Dates and document types
+        date_codes, date_uniques = _factorize(column("invoice_date"))
+        invoice_dates = _take([self._parse_date(v) for v in date_uniques], date_codes)
+        type_codes, type_uniques = _factorize(column("invoice_type", ""))
+        doc_types = _take(
+            [self._detect_document_type(v, file_type) for v in type_uniques],
+            type_codes
+        )
+        
+        # GSTR section: B2B for a 15-char GSTIN, else B2CL/B2CS on value
+        gstin = column("gstin_uin")
+        gstin_codes, gstin_uniques = _factorize(gstin)
+        # One pass over distinct GSTINs: 0 = blank, 1 = 15 chars, 2 = other
+        gstin_kind = _take(
+            [(1 if len(str(v).strip()) == 15 else 2) if v else 0 for v in gstin_uniques],
+            gstin_codes, np.int8
+        )
+        has_gstin = gstin_kind != 0
+        section_idx = np.select(
+            [gstin_kind == 1, ~has_gstin & tv_b2cl, ~has_gstin],
+            [1, 2, 3],
+            default=0
+        )
+        sections = _take([None, GSTRSection.B2B, GSTRSection.B2CL, GSTRSection.B2CS], section_idx)
+        
+        # Rows with a non-finite taxable value or an unusable place of supply
+        # failed per-row normalization before; they are still skipped
+        valid = has_invoice_no & tv_finite & rate_ok & pos_ok
+        bad_rows = int((has_invoice_no & ~valid).sum())
+        if bad_rows:
+            logger.error(f"Skipping {bad_rows} rows with unparseable amounts or place of supply in {filename}")
+        
+        # Tax split for every exactly-representable row in one pass
+        fast = valid & tv_fits & rate_fits
+        split = compute_signed_tax_split_paise(tv_paise[fast], rate_bp[fast], is_intra[fast])
+        fast_pos = np.full(n, -1, dtype=np.int64)
+        fast_pos[fast] = np.arange(int(fast.sum()))
+        cgst_f = (split["cgst"] / 100.0).tolist()
+        sgst_f = (split["sgst"] / 100.0).tolist()
+        igst_f = (split["igst"] / 100.0).tolist()
+        total_f = ((split["cgst"] + split["sgst"] + split["igst"]) / 100.0).tolist()
+        diff_f = (split["rounding_diff"] / 100.0).tolist()
+        
+        origin = "meesho" if "meesho" in file_type.value.lower() else "manual"
+        # Numeric HSN / GSTIN cells are passed as text so they satisfy the
+        # Optional[str] fields instead of failing (and splitting) the batch
+        hsn_codes, hsn_uniques = _factorize(column("hsn_code"))
+        hsn = _take([_as_optional_str(v) for v in hsn_uniques], hsn_codes)
+        gstin_values = _take([_as_optional_str(v) for v in gstin_uniques], gstin_codes)
+        
+        fast_pos = fast_pos.tolist()
+        is_intra = is_intra.tolist()
+        is_return = is_return.tolist()
+        
+        row_fields = []
+        row_indices = []
+        for row_idx in np.flatnonzero(valid).tolist():
+            try:
+                j = fast_pos[row_idx]
+                if j >= 0:
+                    tax_result = {
+                        "tax_amount_raw": tax_raw[row_idx],
+                        "tax_amount": total_f[j],
+                        "cgst_amount": cgst_f[j],
+                        "sgst_amount": sgst_f[j],
+                        "igst_amount": igst_f[j],
+                        "rounding_diff": diff_f[j],
+                        "is_intra_state": is_intra[row_idx]
+                    }
+                else:
+                    # Out-of-range or over-precise values keep the Decimal path
+                    tax_result = compute_tax(
+                        tv_dec[row_idx], rate_dec[row_idx], self.seller_state_code, pos_code[row_idx]
+                    )
+                
+                row_fields.append({
+                    "upload_id": upload_id,
+                    "invoice_no_raw": inv_raw[row_idx],
+                    "invoice_no_norm": inv_norm[row_idx],
+                    "doc_type": doc_types[row_idx],
+                    "invoice_date": invoice_dates[row_idx],
+                    "gstin_uin": gstin_values[row_idx],
+                    "place_of_supply_state": pos_state[row_idx],
+                    "place_of_supply_code": pos_code[row_idx],
+                    "taxable_value_raw": taxable_raw[row_idx],
+                    "taxable_value": taxable_float[row_idx],
+                    "gst_rate": rate_float[row_idx],
+                    "computed_tax": tax_result,
+                    "is_return": is_return[row_idx],
+                    "is_intra_state": tax_result["is_intra_state"],
+                    "origin": origin,
+                    "gstr_section": sections[row_idx],
+                    "file_type": file_type,
+                    "hsn_code": hsn[row_idx],
+                    "raw_data": dict(zip(headers, data_rows[row_idx]))
+                })
+                row_indices.append(row_idx)
+            
+            except Exception as e:
+                logger.error(f"Error parsing row {row_idx} in {filename}: {str(e)}")
+                continue
+        
+        return self._validate_lines(row_fields, row_indices, filename)
     
-    def _parse_row_to_canonical(
+    def _validate_lines(
         self,
-        row: Dict,
-        upload_id: str,
-        file_type: FileType,
-        raw_data: Dict
-    ) -> Optional[CanonicalInvoiceLine]:
+        row_fields: List[Dict],
+        row_indices: List[int],
+        filename: str
+    ) -> List[CanonicalInvoiceLine]:
         """
-        Parse row dict to CanonicalInvoiceLine with normalization
+        Validate all prepared rows in one pydantic-core call
+        
+        Rows that fail are logged and dropped, and the rest are validated
+        again, so one bad row does not cost the whole file its batch path.
         """
         try:
-            # Extract and normalize invoice number
-            invoice_no_raw = str(row.get("invoice_no", "")).strip()
-            if not invoice_no_raw:
-                return None
-            
-            invoice_no_norm = invoice_no_raw.upper().strip()
-            
-            # Detect document type
-            doc_type = self._detect_document_type(row, file_type)
-            
-            # Parse monetary values using Decimal
-            taxable_value_raw_decimal = parse_money(row.get("taxable_value", 0))
-            gst_rate_decimal = parse_money(row.get("gst_rate", 0))
-            
-            # Determine if return (negative value)
-            is_return = file_type == FileType.TCS_SALES_RETURN or taxable_value_raw_decimal < 0
-            if is_return and taxable_value_raw_decimal > 0:
-                taxable_value_raw_decimal = -taxable_value_raw_decimal
-            
-            # Normalize state
-            place_of_supply_state = row.get("place_of_supply", "")
-            place_of_supply_code = normalize_state_to_code(place_of_supply_state) or self.seller_state_code
-            
-            # Compute tax with Decimal precision
-            tax_result = compute_tax(
-                taxable_value_raw_decimal,
-                gst_rate_decimal,
-                self.seller_state_code,
-                place_of_supply_code
-            )
-            
-            # Parse date
-            invoice_date = self._parse_date(row.get("invoice_date"))
-            
-            # Detect GSTR section
-            gstr_section = self._detect_gstr_section(row)
-            
-            # Create canonical line
-            canonical_line = CanonicalInvoiceLine(
-                upload_id=upload_id,
-                invoice_no_raw=invoice_no_raw,
-                invoice_no_norm=invoice_no_norm,
-                doc_type=doc_type,
-                invoice_date=invoice_date,
-                gstin_uin=row.get("gstin_uin"),
-                place_of_supply_state=place_of_supply_state,
-                place_of_supply_code=place_of_supply_code,
-                taxable_value_raw=str(taxable_value_raw_decimal),
-                taxable_value=float(taxable_value_raw_decimal),
-                gst_rate=float(gst_rate_decimal),
-                computed_tax=tax_result,
-                is_return=is_return,
-                is_intra_state=tax_result["is_intra_state"],
-                origin="meesho" if "meesho" in file_type.value.lower() else "manual",
-                gstr_section=gstr_section,
-                file_type=file_type,
-                hsn_code=row.get("hsn_code"),
-                raw_data=raw_data
-            )
-            
-            return canonical_line
+            return CANONICAL_INVOICE_LINE_LIST_ADAPTER.validate_python(row_fields)
+        except ValidationError as e:
+            bad = {}
+            for error in e.errors():
+                bad.setdefault(error["loc"][0], error["msg"])
+        
+        for position, msg in bad.items():
+            logger.error(f"Error parsing row {row_indices[position]} in {filename}: {msg}")
+        
+        return CANONICAL_INVOICE_LINE_LIST_ADAPTER.validate_python(
+            [fields for position, fields in enumerate(row_fields) if position not in bad]
+        )
+    
+    def _read_all_rows(self, content: bytes, filename: str) -> List[List]:
+        """Read all rows from file"""
+        rows = []
         
+        try:
+            rows = self._get_rows(content, filename)
         except Exception as e:
-            logger.error(f"Error parsing row to canonical: {str(e)}")
-            return None
+            logger.error(f"Error reading rows from {filename}: {str(e)}")
+        
+        return rows
     
-    def _detect_document_type(self, row: Dict, file_type: FileType) -> DocumentType:
-        """Detect document type from row data"""
+    def _detect_document_type(self, invoice_type, file_type: FileType) -> DocumentType:
+        """Detect document type from an invoice_type value"""
         # Check invoice_type field
-        inv_type = str(row.get("invoice_type", "")).lower().strip()
+        inv_type = str(invoice_type).lower().strip()
         
-        for key, doc_type in DOCUMENT_TYPES.items():
-            if key in inv_type:
-                return DocumentType(doc_type)
+        if _DOCUMENT_TYPE_RE.search(inv_type):
+            for key, doc_type in _DOCUMENT_TYPE_RULES:
+                if key in inv_type:
+                    return doc_type
         
         # Check file type
         if file_type == FileType.CREDIT_NOTE:
@@ -344,37 +625,77 @@ class EnhancedFileParser:
         
         return DocumentType.TAX_INVOICE
     
-    def _detect_gstr_section(self, row: Dict) -> Optional[GSTRSection]:
-        """Auto-detect GSTR-1 section for this row"""
-        gstin = row.get("gstin_uin", "")
-        taxable_value = parse_money(row.get("taxable_value", 0))
-        
-        # B2B: Has valid GSTIN
-        if gstin and len(str(gstin).strip()) == 15:
-            return GSTRSection.B2B
-        
-        # B2CL: No GSTIN and value > 2.5L
-        if not gstin and taxable_value > Decimal("250000"):
-            return GSTRSection.B2CL
-        
-        # B2CS: No GSTIN and value <= 2.5L
-        if not gstin:
-            return GSTRSection.B2CS
-        
-        return None
-    
     def _parse_date(self, date_value) -> Optional[str]:
         """Parse date to ISO format YYYY-MM-DD"""
         if not date_value:
             return None
         
         try:
-            if isinstance(date_value, datetime):
+            if isinstance(date_value, (datetime, date)):
                 return date_value.strftime("%Y-%m-%d")
             
-            # Try parsing string
+            # Excel serial day numbers (cells read without a date format)
+            if isinstance(date_value, (int, float)) and not isinstance(date_value, bool):
+                if EXCEL_SERIAL_MIN <= date_value <= EXCEL_SERIAL_MAX:
+                    return (EXCEL_EPOCH + timedelta(days=date_value)).strftime("%Y-%m-%d")
+            
             date_str = str(date_value).strip()
-            # Add more date format parsing as needed
+            
+            # Regex fast paths instead of trying strptime formats one by one
+            match = _DATE_ISO_RE.match(date_str)
+            if match:
+                return match.group(1)
+            
+            match = _DATE_DMY_RE.match(date_str)
+            if match:
+                day, month, year = (int(g) for g in match.groups())
+                try:
+                    return date(year, month, day).isoformat()
+                except ValueError:
+                    # Impossible dates like 31/02 fall through unchanged
+                    pass
+            
+            # Unrecognized formats are passed through unchanged
             return date_str
         except:
             return None
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Shared worker pool for per-file parsing, created on first use
+    
+    Uses the spawn start method so workers never inherit open workbook or
+    client file descriptors from the server process.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+def parse_file_worker(
+    seller_state_code: str,
+    content: bytes,
+    filename: str,
+    upload_id: str,
+    mappings: Optional[Dict[str, HeaderMapping]],
+    file_type: FileType
+) -> List[CanonicalInvoiceLine]:
+    """
+    Worker entry point: map (if needed) and parse one file in a pool process
+    
+    With mappings=None the file's own headers are auto-mapped, so the
+    workbook is only decoded inside the worker.
+    """
+    parser = EnhancedFileParser(seller_state_code=seller_state_code)
+    if mappings is None:
+        headers = parser.read_headers(content, filename)
+        mappings = parser.header_matcher.map_headers(headers)
+    return parser.parse_file_with_mapping(content, filename, upload_id, mappings, file_type)
@@ -0,0 +1,143 @@
+"""Compiled numeric kernels for bulk invoice-line parsing"""
+
+import logging
+from typing import Dict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+try:
+    from numba import njit, prange
+    HAS_NUMBA = True
+except ImportError:
+    logger.warning("⚠️ numba not available, using NumPy tax-split kernel")
+    HAS_NUMBA = False
+
+
+# Taxable values are scaled to micro-rupees and rates to basis points, so
+# tv * rate is the exact tax in 1e-8 paise for inputs with up to six decimal
+# places; it fits in int64 for taxable values below about 3e9 rupees
+TV_SCALE = 1_000_000
+RATE_SCALE = 100
+TAX_DIVISOR = TV_SCALE * RATE_SCALE
+
+
+def _tax_split_numpy(tv, rate, intra, out_cgst, out_sgst, out_igst, out_total):
+    """NumPy fallback with the same integer semantics as the compiled kernel"""
+    total = (tv * rate + TAX_DIVISOR // 2) // TAX_DIVISOR
+    cgst = (total + 1) // 2
+    out_total[:] = total
+    out_cgst[:] = np.where(intra, cgst, 0)
+    out_sgst[:] = np.where(intra, total - cgst, 0)
+    out_igst[:] = np.where(intra, 0, total)
+
+
+if HAS_NUMBA:
+    @njit(parallel=True, cache=True)
+    def _tax_split_kernel(tv, rate, intra, out_cgst, out_sgst, out_igst, out_total):
+        """
+        Per-row tax split on int64 micro-rupee / basis-point arrays
+
+        Rounds the exact product half-up to the paisa, matching
+        compute_tax_split's Decimal ROUND_HALF_UP for non-negative taxable values.
+        """
+        for i in prange(tv.shape[0]):
+            t = (tv[i] * rate[i] + TAX_DIVISOR // 2) // TAX_DIVISOR
+            out_total[i] = t
+            if intra[i]:
+                c = (t + 1) // 2
+                out_cgst[i] = c
+                out_sgst[i] = t - c
+                out_igst[i] = 0
+            else:
+                out_igst[i] = t
+                out_cgst[i] = 0
+                out_sgst[i] = 0
+else:
+    _tax_split_kernel = _tax_split_numpy
+
+
+def compute_tax_split_bulk(
+    taxable_values: np.ndarray,
+    gst_rates: np.ndarray,
+    is_intra_state: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Compute CGST/SGST/IGST for a whole file in one kernel call
+    
+    Taxable values are not pre-rounded to paise: as in compute_tax_split, only
+    the tax is rounded, so results match it for values with up to six decimals.
+
+    Args:
+        taxable_values: Non-negative taxable values in rupees
+        gst_rates: GST rates in percent (e.g., 18 for 18%)
+        is_intra_state: Boolean mask, True where seller and customer state match
+
+    Returns:
+        dict of float64 arrays: tax_amount, cgst_amount, sgst_amount, igst_amount
+    """
+    tv = np.rint(np.asarray(taxable_values, dtype=np.float64) * TV_SCALE).astype(np.int64)
+    rate = np.rint(np.asarray(gst_rates, dtype=np.float64) * RATE_SCALE).astype(np.int64)
+    intra = np.asarray(is_intra_state, dtype=np.bool_)
+
+    # Pre-allocate outputs once per file
+    n = tv.shape[0]
+    out_cgst = np.empty(n, dtype=np.int64)
+    out_sgst = np.empty(n, dtype=np.int64)
+    out_igst = np.empty(n, dtype=np.int64)
+    out_total = np.empty(n, dtype=np.int64)
+
+    _tax_split_kernel(tv, rate, intra, out_cgst, out_sgst, out_igst, out_total)
+
+    return {
+        "tax_amount": out_total / 100.0,
+        "cgst_amount": out_cgst / 100.0,
+        "sgst_amount": out_sgst / 100.0,
+        "igst_amount": out_igst / 100.0,
+    }
+
+
+def _round_half_up_div(num: np.ndarray, den: int) -> np.ndarray:
+    """Integer num / den rounded half away from zero, like Decimal ROUND_HALF_UP"""
+    q = (np.abs(num) * 2 + den) // (2 * den)
+    return np.where(num < 0, -q, q)
+
+
+def compute_signed_tax_split_paise(
+    taxable_paise: np.ndarray,
+    rate_bp: np.ndarray,
+    is_intra_state: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Vectorized equivalent of decimal_utils.compute_tax on exact integers
+
+    Unlike compute_tax_split_bulk this accepts negative (return) values and
+    reproduces compute_tax's remainder-based SGST and rounding difference.
+
+    Args:
+        taxable_paise: Signed taxable values in paise (int64)
+        rate_bp: GST rates in basis points, e.g. 1800 for 18% (int64)
+        is_intra_state: Boolean mask, True where seller and supply state match
+
+    Returns:
+        dict of int64 paise arrays: cgst, sgst, igst, rounding_diff
+    """
+    # Raw tax in units of 1/10000 paise; exact for the magnitudes callers allow
+    raw = np.asarray(taxable_paise, dtype=np.int64) * np.asarray(rate_bp, dtype=np.int64)
+    intra = np.asarray(is_intra_state, dtype=np.bool_)
+
+    cgst = _round_half_up_div(raw, 20000)
+    sgst = _round_half_up_div(raw - cgst * 10000, 10000)
+    total_rounded = _round_half_up_div(raw, 10000)
+
+    cgst = np.where(intra, cgst, 0)
+    sgst = np.where(intra, sgst, 0)
+    igst = np.where(intra, 0, total_rounded)
+
+    return {
+        "cgst": cgst,
+        "sgst": sgst,
+        "igst": igst,
+        "rounding_diff": total_rounded - (cgst + sgst + igst),
+    }
@@ -38,36 +38,11 @@ def run_migration():
     print("🚀 Executing migration...")
     
     try:
-        # Split SQL into individual statements
-        statements = [s.strip() for s in sql.split(';') if s.strip() and not s.strip().startswith('--')]
-        
-        success_count = 0
-        error_count = 0
-        
-        for i, statement in enumerate(statements):
-            try:
-                # Execute using Supabase's RPC or direct SQL execution
-                # Note: Supabase Python client may not support direct SQL execution
-                # You might need to run this in Supabase SQL Editor instead
-                result = supabase.rpc('execute_sql', {'query': statement}).execute()
-                success_count += 1
-                print(f"✅ Statement {i+1}/{len(statements)} executed successfully")
-            except Exception as e:
-                error_count += 1
-                print(f"⚠️  Statement {i+1}/{len(statements)} failed: {str(e)}")
-                # Continue with other statements
-        
-        print(f"\n📊 Migration Summary:")
-        print(f"   ✅ Successful: {success_count}")
-        print(f"   ❌ Failed: {error_count}")
-        
-        if error_count == 0:
-            print("\n🎉 Migration completed successfully!")
-        else:
-            print(f"\n⚠️  Migration completed with {error_count} error(s)")
-            print("\n💡 Note: If direct SQL execution is not supported by Supabase Python client,")
-            print("   please run the SQL file manually in Supabase SQL Editor:")
-            print(f"   File: {migration_file}")
+        # Submit the whole file in one call: the server parses it with its own
+        # lexer, so semicolons inside literals or $$ bodies are handled and the
+        # migration costs a single round trip instead of one per statement
+        supabase.rpc('execute_sql', {'query': sql}).execute()
+        print("\n🎉 Migration completed successfully!")
             
     except Exception as e:
         print(f"❌ Migration failed: {str(e)}")
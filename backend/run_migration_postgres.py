@@ -15,6 +15,7 @@ load_dotenv(ROOT_DIR / '.env')
 
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
 DB_PASSWORD = "Kaddu@Anshu"  # Provided password
+EXPECTED_TABLES = ('uploads', 'invoice_lines', 'gstr_exports')
 
 def get_connection_params():
     """Extract connection parameters from Supabase URL"""
@@ -69,22 +70,25 @@ def run_migration():
             SELECT table_name 
             FROM information_schema.tables 
             WHERE table_schema = 'public' 
-            AND table_name IN ('uploads', 'invoice_lines', 'gstr_exports')
+            AND table_name = ANY(%s)
             ORDER BY table_name;
-        """)
+        """, (list(EXPECTED_TABLES),))
         
-        tables = cursor.fetchall()
-        if tables:
-            print(f"✅ Found {len(tables)} tables:")
-            for table in tables:
-                print(f"   ✓ {table[0]}")
+        found = {row[0] for row in cursor.fetchall()}
+        missing = set(EXPECTED_TABLES) - found
+        if found:
+            print(f"✅ Found {len(found)} tables:")
+            for table in sorted(found):
+                print(f"   ✓ {table}")
         else:
             print("⚠️  No tables found")
+        for table in sorted(missing):
+            print(f"   ✗ {table} is missing")
         
         cursor.close()
         conn.close()
         
-        return len(tables) == 3
+        return not missing
         
     except Exception as e:
         print(f"❌ Error: {str(e)}")
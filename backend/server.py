@@ -8,13 +8,14 @@ from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
+import asyncio
 import logging
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
 import uuid
 from datetime import datetime, timezone
 import json
-from io import BytesIO
+import re
 
 # Load environment and configure logging FIRST
 ROOT_DIR = Path(__file__).parent
@@ -26,20 +27,32 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    logger.warning("⚠️ orjson not available, serializing exports with json")
+    HAS_ORJSON = False
+
+_loads = orjson.loads if HAS_ORJSON else json.loads
+
+# Body of a ```json ... ``` fenced block in a Gemini reply
+_FENCE_RE = re.compile(r'^```(?:json)?\s*(.*?)\s*(?:```|$)', re.S)
+
 # Import canonical models
 from models_canonical import (
     Upload, UploadStatus, FileType, FileInfo,
     CanonicalInvoiceLine, DocumentRange, GSTR1Export,
     ProcessingResult, UploadCreateResponse, HeaderMapping,
-    MappingTemplate
+    MappingTemplate, CANONICAL_INVOICE_LINE_LIST_ADAPTER
 )
-from parser_enhanced import EnhancedFileParser
+from parser_enhanced import EnhancedFileParser, get_process_pool, parse_file_worker
 from gstr1_generator_schema_driven import SchemaDriverGSTR1Generator
 from gstr1_complete_generator import CompleteGSTR1Generator
 from gstr1_gemini_complete_generator import GeminiGSTR1Generator
 from invoice_range_detector import InvoiceRangeDetector
 from auto_mapper import HeaderMatcher, create_meesho_mapping_template
-from gemini_service import gemini_service
+from gemini_service import gemini_service, model as gemini_model
 
 # Use MongoDB client (fallback when Supabase not configured)
 try:
@@ -55,7 +68,10 @@ except Exception as e:
         document_ranges_collection, storage, auth
     )
     
-from json_utils import safe_json_response
+from json_utils import safe_json_response, fast_json_response
+
+# Read once at import; the CORS middleware is configured from this
+ALLOWED_ORIGINS = tuple(os.environ.get('CORS_ORIGINS', '*').split(','))
 
 # Import auth middleware with fallback
 try:
@@ -155,84 +171,53 @@ async def upload_files(
         all_files = []
         needs_mapping = False
         storage_urls = {}
+        storage_paths = {}
+        storage_errors = {}
         gemini_file_insights = {}
         
-        # Process each uploaded file
-        for file in files:
-            content = await file.read()
-            
-            # Upload to Supabase Storage
-            content_type = file.content_type or "application/octet-stream"
-            storage_path = f"{upload.id}/{file.filename}"
-            
-            try:
-                storage_result = storage.upload_file(
-                    storage_path,
-                    content,
-                    user_id,
-                    content_type
-                )
-                storage_urls[file.filename] = storage_result
-                logger.info(f"Uploaded {file.filename} to storage: {storage_result['path']}")
-            except Exception as se:
-                logger.warning(f"Storage upload failed for {file.filename}: {str(se)}, falling back to database storage")
-                # Fallback to old method if storage fails
-                upload.metadata[f"file_content_{file.filename}"] = content.hex()
-            
-            # Check if ZIP
-            if file.filename.lower().endswith('.zip'):
-                extracted_files = parser.extract_files_from_zip(content)
-                
-                for filename, file_content in extracted_files:
-                    file_info = parser.detect_and_classify_file(filename, file_content)
-                    
-                    # Use Gemini to enhance file detection
-                    if use_gemini and file_info.columns:
-                        try:
-                            gemini_suggestion = self._gemini_suggest_file_type(filename, file_info.columns)
-                            if gemini_suggestion:
-                                gemini_file_insights[filename] = gemini_suggestion
-                                logger.info(f"Gemini suggestion for {filename}: {gemini_suggestion}")
-                        except Exception as ge:
-                            logger.warning(f"Gemini file analysis failed: {ge}")
-                    
-                    all_files.append(file_info)
-                    
-                    if file_info.needs_mapping:
-                        needs_mapping = True
-                    
-                    # Store extracted file content (in metadata as fallback)
-                    upload.metadata[f"file_content_{filename}"] = file_content.hex()
-            else:
-                file_info = parser.detect_and_classify_file(file.filename, content)
-                
-                # Use Gemini to enhance file detection
-                if use_gemini and file_info.columns:
-                    try:
-                        gemini_suggestion = self._gemini_suggest_file_type(file.filename, file_info.columns)
-                        if gemini_suggestion:
-                            gemini_file_insights[file.filename] = gemini_suggestion
-                            logger.info(f"Gemini suggestion for {file.filename}: {gemini_suggestion}")
-                    except Exception as ge:
-                        logger.warning(f"Gemini file analysis failed: {ge}")
-                
+        # Store and classify every uploaded file concurrently; storage calls
+        # are blocking HTTP, so each file's work runs in a worker thread
+        contents = await asyncio.gather(*(file.read() for file in files))
+        results = await asyncio.gather(*(
+            asyncio.to_thread(
+                _store_and_classify, parser, upload.id, user_id,
+                file.filename, content, file.content_type or "application/octet-stream"
+            )
+            for file, content in zip(files, contents)
+        ))
+        
+        for classified in results:
+            for file_info, storage_result, content_hex, storage_error in classified:
                 all_files.append(file_info)
-                
+                if storage_result:
+                    storage_urls[file_info.filename] = storage_result
+                    storage_paths[file_info.filename] = storage_result["path"]
+                else:
+                    # Storage failed twice; keep the bytes inline, where
+                    # process_upload still looks for them
+                    upload.metadata[f"file_content_{file_info.filename}"] = content_hex
+                    storage_errors[file_info.filename] = storage_error
                 if file_info.needs_mapping:
                     needs_mapping = True
-                
-                # Store content in metadata as fallback
-                if file.filename not in storage_urls:
-                    upload.metadata[f"file_content_{file.filename}"] = content.hex()
         
+        # Use Gemini to enhance file detection (one prompt for all files)
+        if use_gemini:
+            gemini_file_insights = await asyncio.to_thread(
+                _gemini_suggest_file_types_batch,
+                [(f.filename, f.columns) for f in all_files if f.columns]
+            )
+            for filename, gemini_suggestion in gemini_file_insights.items():
+                logger.info(f"Gemini suggestion for {filename}: {gemini_suggestion}")
+        
+        parser.clear_cache()
         upload.files = all_files
         upload.status = UploadStatus.MAPPING if needs_mapping else UploadStatus.UPLOADED
         upload.metadata["gemini_insights"] = gemini_file_insights
+        upload.metadata["storage_paths"] = storage_paths
+        upload.metadata["storage_errors"] = storage_errors
         
         # Save to database
-        upload_dict = upload.model_dump(mode='json')
-        upload_dict['upload_date'] = upload_dict['upload_date'].isoformat() if hasattr(upload_dict['upload_date'], 'isoformat') else upload_dict['upload_date']
-        upload_dict['files'] = [f.model_dump(mode='json') for f in upload.files]
+        upload_dict = upload.model_dump(mode='json')  # files and upload_date already JSON-ready
         upload_dict['storage_urls'] = storage_urls
         
         await uploads_collection.create(upload_dict, user_id=user_id)
@@ -250,19 +235,98 @@ async def upload_files(
         logger.error(f"Upload error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
-def _gemini_suggest_file_type(filename: str, columns: List[str]) -> Optional[Dict]:
-    """Use Gemini to suggest file type based on filename and columns"""
+def _store_file_content(
+    storage_path: str,
+    content: bytes,
+    user_id: str,
+    content_type: str = "application/octet-stream"
+) -> Dict:
+    """Upload file bytes to storage, retrying once before giving up"""
     try:
-        import google.generativeai as genai
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
-        
+        return storage.upload_file(storage_path, content, user_id, content_type)
+    except Exception as e:
+        logger.warning(f"Storage upload failed for {storage_path}: {str(e)}, retrying")
+        return storage.upload_file(storage_path, content, user_id, content_type)
+
+def _store_or_inline(
+    upload_id: str,
+    user_id: str,
+    filename: str,
+    content: bytes,
+    content_type: str = "application/octet-stream"
+) -> Tuple[Optional[Dict], Optional[str], Optional[str]]:
+    """
+    Store one file, keeping its bytes inline if storage fails twice
+    
+    Returns:
+        (storage result, None, None) on success, or
+        (None, hex-encoded content, error message) on failure
+    """
+    try:
+        storage_result = _store_file_content(f"{upload_id}/{filename}", content, user_id, content_type)
+        logger.info(f"Uploaded {filename} to storage: {storage_result['path']}")
+        return storage_result, None, None
+    except Exception as e:
+        logger.error(f"Storage upload failed for {filename}: {str(e)}, keeping content in upload metadata")
+        return None, content.hex(), str(e)
+
+def _store_and_classify(
+    parser: EnhancedFileParser,
+    upload_id: str,
+    user_id: str,
+    filename: str,
+    content: bytes,
+    content_type: str
+) -> List[Tuple[FileInfo, Optional[Dict], Optional[str], Optional[str]]]:
+    """
+    Store one uploaded file and classify what it contains
+    
+    ZIP members are extracted, classified and stored individually; the
+    archive itself is not stored, since processing only reads the members.
+    
+    Returns:
+        [(FileInfo, storage result, inline hex content, storage error)]
+        for each stored file; see _store_or_inline
+    """
+    if not filename.lower().endswith('.zip'):
+        stored = _store_or_inline(upload_id, user_id, filename, content, content_type)
+        file_info = parser.detect_and_classify_file(filename, content)
+        parser.release_file(content, filename)
+        return [(file_info, *stored)]
+    
+    # Members arrive one at a time; each is stored, classified and released
+    # before the next, so memory stays bounded by the largest member
+    classified = []
+    for member_name, member_content in parser.extract_files_from_zip(content):
+        file_info = parser.detect_and_classify_file(member_name, member_content)
+        parser.release_file(member_content, member_name)
+        classified.append((file_info, *_store_or_inline(upload_id, user_id, member_name, member_content)))
+    return classified
+
+def _gemini_suggest_file_types_batch(entries: List[Tuple[str, List[str]]]) -> Dict[str, Dict]:
+    """
+    Use Gemini to suggest file types for several files in one request
+    
+    Args:
+        entries: (filename, columns) pairs
+    
+    Returns:
+        dict of filename -> suggestion; files Gemini skipped are absent
+    """
+    if not entries:
+        return {}
+    
+    try:
+        files_block = "\n".join(
+            f"- Filename: {filename}\n  Columns: {', '.join(columns[:15])}"
+            for filename, columns in entries
+        )
         prompt = f"""
-Analyze this Excel/CSV file for GST filing and suggest its type:
+Analyze these Excel/CSV files for GST filing and suggest the type of each:
 
-Filename: {filename}
-Columns: {', '.join(columns[:15])}
+{files_block}
 
-Determine the file type from these options:
+Determine each file type from these options:
 - B2B Invoices (registered buyers with GSTIN)
 - B2C Sales (unregistered buyers, no GSTIN)
 - Credit Notes
@@ -272,32 +336,38 @@ Determine the file type from these options:
 - Tax Invoices
 - Unknown
 
-Also suggest the GSTR-1 table/section this belongs to.
-
-Return JSON:
-{{
-    "file_type": "...",
-    "gstr_section": "...",
-    "confidence": "high/medium/low",
-    "reason": "..."
-}}
+Also suggest the GSTR-1 table/section each belongs to.
+
+Return a JSON array with one object per file:
+[
+    {{
+        "filename": "...",
+        "file_type": "...",
+        "gstr_section": "...",
+        "confidence": "high/medium/low",
+        "reason": "..."
+    }}
+]
 """
         
-        response = model.generate_content(prompt)
+        response = gemini_model.generate_content(prompt)
         response_text = response.text.strip()
         
         # Clean markdown
-        if response_text.startswith('```'):
-            response_text = response_text.split('```')[1]
-            if response_text.startswith('json'):
-                response_text = response_text[4:]
-            response_text = response_text.strip()
-        
-        import json
-        return json.loads(response_text)
+        fenced = _FENCE_RE.match(response_text)
+        if fenced:
+            response_text = fenced.group(1)
+        
+        suggestions = _loads(response_text)
+        known = {filename for filename, _ in entries}
+        return {
+            s["filename"]: {k: v for k, v in s.items() if k != "filename"}
+            for s in suggestions
+            if isinstance(s, dict) and s.get("filename") in known
+        }
     except Exception as e:
         logger.warning(f"Gemini file type suggestion failed: {e}")
-        return None
+        return {}
 
 
 @api_router.get("/mapping/suggestions/{upload_id}")
@@ -386,69 +456,90 @@ async def process_upload(upload_id: str):
         await uploads_collection.update(upload_id, {"status": UploadStatus.PROCESSING.value})
         
         seller_state_code = upload.metadata.get("seller_state_code", "27")
-        parser = EnhancedFileParser(seller_state_code=seller_state_code)
         
         all_invoice_lines = []
         errors = []
         
         # Get approved mappings if any
         approved_mappings = upload.metadata.get("approved_mappings", {})
+        storage_paths = upload.metadata.get("storage_paths", {})
         
-        # Process each file
+        # Collect one parse task per file
+        tasks = []
         for file_info in upload.files:
             if not file_info.detected and file_info.filename not in approved_mappings:
                 errors.append(f"File {file_info.filename} needs mapping")
                 continue
             
             try:
-                # Retrieve file content
-                content_hex = upload.metadata.get(f"file_content_{file_info.filename}")
-                if not content_hex:
-                    errors.append(f"Content not found for {file_info.filename}")
-                    continue
-                
-                content = bytes.fromhex(content_hex)
+                # Locate file content (downloaded alongside parsing below)
+                storage_path = storage_paths.get(file_info.filename)
+                content_hex = None
+                if not storage_path:
+                    # Uploads made before files moved to storage
+                    content_hex = upload.metadata.get(f"file_content_{file_info.filename}")
+                    if not content_hex:
+                        errors.append(f"Content not found for {file_info.filename}")
+                        continue
                 
-                # Get mappings (either auto or user-approved)
+                # Get mappings (user-approved, or None to auto-map in the worker)
+                file_mappings = None
                 if file_info.filename in approved_mappings:
                     file_mappings = {
                         m["file_header"]: HeaderMapping(**m)
                         for m in approved_mappings[file_info.filename]
                     }
-                else:
-                    # Use auto-detected mappings
-                    headers = parser.read_headers(content, file_info.filename)
-                    file_mappings = parser.header_matcher.map_headers(headers)
-                
-                # Parse with mappings
-                invoice_lines = parser.parse_file_with_mapping(
-                    content,
-                    file_info.filename,
-                    upload_id,
-                    file_mappings,
-                    file_info.file_type
-                )
                 
-                all_invoice_lines.extend(invoice_lines)
-                logger.info(f"Parsed {len(invoice_lines)} lines from {file_info.filename}")
+                tasks.append((file_info.filename, storage_path, content_hex, file_mappings, file_info.file_type))
                 
             except Exception as e:
                 error_msg = f"Error parsing {file_info.filename}: {str(e)}"
                 errors.append(error_msg)
                 logger.error(error_msg)
         
+        # Files are independent: each one is downloaded in a thread, then
+        # parsed in a worker process as soon as its bytes arrive
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        
+        async def _download_and_parse(filename, storage_path, content_hex, file_mappings, file_type):
+            if storage_path:
+                content = await asyncio.to_thread(storage.download_file, storage_path)
+            else:
+                content = bytes.fromhex(content_hex)
+            return await loop.run_in_executor(
+                pool, parse_file_worker,
+                seller_state_code, content, filename, upload_id, file_mappings, file_type
+            )
+        
+        results = await asyncio.gather(
+            *(_download_and_parse(*task) for task in tasks),
+            return_exceptions=True
+        )
+        
+        for (filename, *_), result in zip(tasks, results):
+            if isinstance(result, Exception):
+                error_msg = f"Error parsing {filename}: {str(result)}"
+                errors.append(error_msg)
+                logger.error(error_msg)
+                continue
+            
+            all_invoice_lines.extend(result)
+            logger.info(f"Parsed {len(result)} lines from {filename}")
+        
         # Save invoice lines
         user_id = upload_doc.get('user_id', 'default_user')
-        if all_invoice_lines:
-            invoice_docs = [line.model_dump(mode='json') for line in all_invoice_lines]
-            invoice_docs = [safe_json_response(doc) for doc in invoice_docs]
-            await invoice_lines_collection.insert_many(invoice_docs, user_id=user_id)
+        # Pydantic's JSON serializer already writes NaN/Infinity as null, so the
+        # lines are sanitized without walking each row in Python; the client
+        # splits them into concurrent batches
+        invoice_docs = _loads(CANONICAL_INVOICE_LINE_LIST_ADAPTER.dump_json(all_invoice_lines))
+        await invoice_lines_collection.insert_many(invoice_docs, user_id=user_id, ordered=False)
         
         # Detect document ranges for Table 13
         range_detector = InvoiceRangeDetector()
         document_ranges, non_sequential = range_detector.detect_ranges(
             upload_id,
-            [line.model_dump() for line in all_invoice_lines]
+            CANONICAL_INVOICE_LINE_LIST_ADAPTER.dump_python(all_invoice_lines)
         )
         
         # Save document ranges (would need a new collection)
@@ -495,12 +586,15 @@ async def generate_gstr1_json(upload_id: str, use_gemini: bool = True):
         if not upload_doc:
             raise HTTPException(status_code=404, detail="Upload not found")
         
-        upload = Upload(**upload_doc)
+        # Only status and metadata are needed: read the stored doc directly
+        # instead of re-validating it (and its file list) into an Upload
+        status = upload_doc.get("status")
+        metadata = upload_doc.get("metadata") or {}
         
-        if upload.status != UploadStatus.COMPLETED:
+        if status != UploadStatus.COMPLETED.value:
             raise HTTPException(
                 status_code=400,
-                detail=f"Upload must be processed first. Current status: {upload.status}"
+                detail=f"Upload must be processed first. Current status: {status}"
             )
         
         # Get invoice lines
@@ -510,9 +604,9 @@ async def generate_gstr1_json(upload_id: str, use_gemini: bool = True):
             raise HTTPException(status_code=400, detail="No invoice lines found")
         
         # Get metadata
-        gstin = upload.metadata.get("gstin", "27AABCE1234F1Z5")
-        filing_period = upload.metadata.get("filing_period", "012025")
-        seller_state_code = upload.metadata.get("seller_state_code", "27")
+        gstin = metadata.get("gstin", "27AABCE1234F1Z5")
+        filing_period = metadata.get("filing_period", "012025")
+        seller_state_code = metadata.get("seller_state_code", "27")
         
         logger.info(f"Generating GSTR-1 with Gemini AI for {len(invoice_lines)} invoice lines")
         
@@ -561,7 +655,7 @@ async def generate_gstr1_json(upload_id: str, use_gemini: bool = True):
         
         logger.info(f"Generated complete GSTR-1 for upload {upload_id} with {export_dict['sections_count']} sections")
         
-        return safe_json_response({
+        return fast_json_response({
             "upload_id": upload_id,
             "gstr1": gstr1_complete,
             "sections_generated": [k for k, v in gstr1_complete.items() if v and k not in ["gstin", "fp", "gt", "cur_gt", "_validation"]],
@@ -578,6 +672,30 @@ async def generate_gstr1_json(upload_id: str, use_gemini: bool = True):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _dumps_indented(value) -> bytes:
+    """Serialize a value as 2-space indented JSON bytes"""
+    if HAS_ORJSON:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, indent=2).encode('utf-8')
+
+
+def _iter_export_json(export_data: Dict):
+    """
+    Yield an export as indented JSON, one top-level key per chunk
+    
+    The output matches serializing the whole dict with indent=2, but peak
+    memory is bounded by the largest section.
+    """
+    if not export_data:
+        yield b"{}"
+        return
+    
+    for i, (key, value) in enumerate(export_data.items()):
+        yield b"{\n  " if i == 0 else b",\n  "
+        yield _dumps_indented(str(key)) + b": " + _dumps_indented(value).replace(b"\n", b"\n  ")
+    yield b"\n}"
+
+
 @api_router.get("/download/{upload_id}/gstr1")
 async def download_gstr1_file(upload_id: str):
     """
@@ -599,21 +717,15 @@ async def download_gstr1_file(upload_id: str):
         upload_doc = await uploads_collection.find_one(upload_id)
         filing_period = upload_doc.get('metadata', {}).get('filing_period', '012025') if upload_doc else '012025'
         
-        # Create JSON string
-        json_string = json.dumps(export_data, indent=2)
-        
         # Create filename
         filename = f"GSTR1_{filing_period}.json"
         
-        # Convert to bytes
-        json_bytes = json_string.encode('utf-8')
-        
+        # Stream one top-level section at a time instead of the whole document
         return StreamingResponse(
-            BytesIO(json_bytes),
+            _iter_export_json(export_data),
             media_type="application/json",
             headers={
                 "Content-Disposition": f"attachment; filename={filename}",
-                "Content-Length": str(len(json_bytes)),
             }
         )
         
@@ -664,8 +776,8 @@ async def get_upload_details(upload_id: str):
         invoice_count = await invoice_lines_collection.count(upload_id)
         upload_doc["invoice_lines_count"] = invoice_count
         
-        # Get exports
-        exports = await gstr_exports_collection.find_by_upload(upload_id)
+        # Get exports; only their number is reported, so skip the JSON payloads
+        exports = await gstr_exports_collection.find_by_upload(upload_id, columns='id')
         upload_doc["exports_count"] = len(exports)
         
         return safe_json_response(upload_doc)
@@ -683,9 +795,11 @@ async def get_preview_data(upload_id: str):
         if not upload_doc:
             raise HTTPException(status_code=404, detail="Upload not found")
         
-        invoice_lines = await invoice_lines_collection.find_by_upload(upload_id)
+        # Totals are grouped by section in the database; only one small
+        # row per section comes back
+        groups = await invoice_lines_collection.aggregate_preview(upload_id)
         
-        if not invoice_lines:
+        if not groups:
             return safe_json_response({
                 "upload_id": upload_id,
                 "summary": {},
@@ -693,28 +807,23 @@ async def get_preview_data(upload_id: str):
             })
         
         # Calculate summary
-        from decimal_utils import parse_money
-        
-        total_taxable = sum(parse_money(line.get("taxable_value", 0)) for line in invoice_lines)
-        total_cgst = sum(parse_money(line.get("computed_tax", {}).get("cgst_amount", 0)) for line in invoice_lines)
-        total_sgst = sum(parse_money(line.get("computed_tax", {}).get("sgst_amount", 0)) for line in invoice_lines)
-        total_igst = sum(parse_money(line.get("computed_tax", {}).get("igst_amount", 0)) for line in invoice_lines)
+        total_taxable = round(sum(g["taxable_value"] or 0 for g in groups), 2)
+        total_cgst = round(sum(g["cgst_amount"] or 0 for g in groups), 2)
+        total_sgst = round(sum(g["sgst_amount"] or 0 for g in groups), 2)
+        total_igst = round(sum(g["igst_amount"] or 0 for g in groups), 2)
         
         # Group by section
-        section_counts = {}
-        for line in invoice_lines:
-            section = line.get("gstr_section", "unknown")
-            section_counts[section] = section_counts.get(section, 0) + 1
+        section_counts = {g["gstr_section"] or "unknown": g["count"] for g in groups}
         
         return safe_json_response({
             "upload_id": upload_id,
             "summary": {
-                "total_lines": len(invoice_lines),
-                "total_taxable_value": float(total_taxable),
-                "total_cgst": float(total_cgst),
-                "total_sgst": float(total_sgst),
-                "total_igst": float(total_igst),
-                "total_tax": float(total_cgst + total_sgst + total_igst)
+                "total_lines": sum(g["count"] for g in groups),
+                "total_taxable_value": total_taxable,
+                "total_cgst": total_cgst,
+                "total_sgst": total_sgst,
+                "total_igst": total_igst,
+                "total_tax": round(total_cgst + total_sgst + total_igst, 2)
             },
             "section_breakdown": section_counts
         })
@@ -724,20 +833,20 @@ async def get_preview_data(upload_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# Include routers
-app.include_router(api_router)
-if HAS_AUTH:
-    app.include_router(auth_routes.router, prefix="/api")
-
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+    allow_origins=list(ALLOWED_ORIGINS),
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+# Include routers
+app.include_router(api_router)
+if HAS_AUTH:
+    app.include_router(auth_routes.router, prefix="/api")
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("GST Filing Automation API - Schema-Driven GSTR-1 - Starting up")
@@ -1,39 +1,63 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Query
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Query, BackgroundTasks, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
+import asyncio
 import logging
 from pathlib import Path
+from cachetools import TTLCache
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone
 import math
 import json
-from io import BytesIO
+import traceback
 
 # Import our custom modules
 from models import (
     Upload, UploadStatus, FileType, FileInfo,
     InvoiceLine, GSTRExport, ProcessingResult,
-    UploadCreateResponse, GSTR1BOutput, GSTR3BOutput
+    UploadCreateResponse, GSTR1BOutput, GSTR3BOutput,
+    INVOICE_LINE_LIST_ADAPTER
 )
-from parser import FileParser
+from parser import FileParser, get_process_pool, parse_file_worker
 from gstr_generator import GSTRGenerator
 from gstr_generator_v2 import PortalCompliantGSTRGenerator  # New portal-compliant generator
-from supabase_client import uploads_collection, invoice_lines_collection, gstr_exports_collection
+from supabase_client import uploads_collection, invoice_lines_collection, gstr_exports_collection, file_storage
 from gemini_service import gemini_service
-from json_utils import safe_json_response
+from json_utils import safe_json_response, fast_json_response
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+# Largest combined upload accepted; bigger requests are rejected before any file is read
+MAX_UPLOAD_BYTES = 500 * 1024 * 1024
 
-# Create the main app without a prefix
-app = FastAPI(title="GST Filing Automation API with AI")
+# gstr_exports columns for listings (everything but json_data)
+EXPORT_SUMMARY_COLUMNS = 'id,upload_id,export_type,export_date,validation_warnings,created_at'
 
-# Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+# Responses for completed uploads, which only change when they are reprocessed
+# or regenerated; both paths evict the upload's entries
+RESPONSE_CACHE = TTLCache(maxsize=1024, ttl=60)
+
+
+def _evict_cached_responses(upload_id: str):
+    RESPONSE_CACHE.pop(("upload", upload_id), None)
+    RESPONSE_CACHE.pop(("downloads", upload_id), None)
+
+
+# Boundary checks for upload parameters; FastAPI compiles these once and
+# answers 422 on mismatch
+FILING_PERIOD_PATTERN = r"^(0[1-9]|1[0-2])\d{4}$"
+GSTIN_PATTERN = r"^\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z][0-9A-Z]{2}$"
+
+# The only invoice-line columns the portal generator reads
+GENERATOR_COLUMNS = ','.join((
+    'file_type', 'state_code', 'gst_rate', 'taxable_value', 'igst_amount',
+    'cgst_amount', 'sgst_amount', 'is_intra_state', 'invoice_no', 'invoice_type'
+))
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
 
 # Configure logging
 logging.basicConfig(
@@ -42,6 +66,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    logger.warning("⚠️ orjson not available, serializing responses with json")
+    HAS_ORJSON = False
+
+# Create the main app without a prefix; plain dict returns are encoded with
+# orjson when it is installed
+app = FastAPI(
+    title="GST Filing Automation API with AI",
+    default_response_class=ORJSONResponse if HAS_ORJSON else JSONResponse
+)
+
+# Create a router with the /api prefix
+api_router = APIRouter(prefix="/api")
+
 
 # ============================================================================
 # API ENDPOINTS
@@ -56,13 +97,20 @@ async def root():
 async def upload_files(
     files: List[UploadFile] = File(...),
     seller_state_code: str = Query(default="27", description="Seller's state code (e.g., 27 for Maharashtra)"),
-    gstin: str = Query(default="27AABCE1234F1Z5", description="Seller's GSTIN"),
-    filing_period: str = Query(default="012025", description="Filing period (MMYYYY)")
+    gstin: str = Query(default="27AABCE1234F1Z5", pattern=GSTIN_PATTERN, description="Seller's GSTIN"),
+    filing_period: str = Query(default="012025", pattern=FILING_PERIOD_PATTERN, description="Filing period (MMYYYY)")
 ):
     """
     Upload Meesho export files (ZIP or individual Excel/CSV files)
     Auto-detects file types and stores for processing
     """
+    # Starlette has already spooled the body to disk; refuse to load it if too big
+    if sum(file.size or 0 for file in files) > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Upload exceeds {MAX_UPLOAD_BYTES // (1024 * 1024)} MB limit"
+        )
+    
     try:
         # Create upload record
         upload = Upload(
@@ -80,23 +128,25 @@ async def upload_files(
         
         # Process each uploaded file
         for file in files:
-            content = await file.read()
-            
             # Check if it's a ZIP file
             if file.filename.lower().endswith('.zip'):
-                # Extract files from ZIP
-                extracted_files = parser.extract_files_from_zip(content)
+                # Extract straight from the spooled upload rather than reading
+                # the whole archive into memory first
+                await file.seek(0)
+                extracted_files = await asyncio.to_thread(parser.extract_files_from_zip, file.file)
                 
                 # Classify extracted files
-                classified = parser.detect_and_classify_files(extracted_files)
+                classified = await asyncio.to_thread(parser.detect_and_classify_files, extracted_files)
                 all_files.extend(classified)
             else:
                 # Single file
-                classified = parser.detect_and_classify_files([(file.filename, content)])
+                content = await file.read()
+                classified = await asyncio.to_thread(parser.detect_and_classify_files, [(file.filename, content)])
                 all_files.extend(classified)
         
-        # Store file info (without content for now)
+        # Store file info; raw bytes go to storage, not into the upload row
         file_infos = []
+        storage_paths = {}
         for f in all_files:
             file_info = FileInfo(
                 filename=f["filename"],
@@ -107,15 +157,20 @@ async def upload_files(
             )
             file_infos.append(file_info)
             
-            # Store content temporarily in upload metadata
-            upload.metadata[f"file_content_{f['filename']}"] = f.get("content", b"").hex()
+            if "content" in f:
+                storage_paths[f["filename"]] = f"{upload.id}/{f['filename']}"
+        
+        contents = {f["filename"]: f["content"] for f in all_files if "content" in f}
+        await asyncio.gather(*(
+            asyncio.to_thread(file_storage.upload_file, path, contents[filename])
+            for filename, path in storage_paths.items()
+        ))
+        upload.metadata["storage_paths"] = storage_paths
         
         upload.files = file_infos
         
         # Save to Supabase
         upload_dict = upload.model_dump(mode='json')
-        upload_dict['upload_date'] = upload_dict['upload_date'].isoformat() if hasattr(upload_dict['upload_date'], 'isoformat') else upload_dict['upload_date']
-        upload_dict['files'] = [f.model_dump(mode='json') for f in upload.files]
         
         await uploads_collection.create(upload_dict)
         
@@ -133,14 +188,47 @@ async def upload_files(
 
 
 @api_router.post("/process/{upload_id}", response_model=ProcessingResult)
-async def process_upload(upload_id: str):
+async def process_upload(
+    upload_id: str,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    background: bool = Query(default=False, description="Return 202 at once and process in the background")
+):
     """
     Process uploaded files: parse, validate, and prepare for JSON generation
     Enhanced with Gemini AI for invoice validation
+    
+    With background=true the request returns immediately; poll
+    /upload/{upload_id} for status and invoice_lines_count.
     """
+    if not background:
+        return await _process_upload(upload_id)
+    
+    if not await uploads_collection.find_one(upload_id, summary=True):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    
+    background_tasks.add_task(_process_upload_in_background, upload_id)
+    response.status_code = 202
+    return ProcessingResult(
+        upload_id=upload_id,
+        status=UploadStatus.PROCESSING.value,
+        invoice_lines_count=0
+    )
+
+
+async def _process_upload_in_background(upload_id: str):
+    """Run _process_upload after the response; failures are already recorded on the upload"""
     try:
-        # Get upload record
-        upload_doc = await uploads_collection.find_one(upload_id)
+        await _process_upload(upload_id)
+    except HTTPException:
+        pass
+
+
+async def _process_upload(upload_id: str) -> ProcessingResult:
+    """Parse every detected file of an upload and store its invoice lines"""
+    try:
+        # Get upload record; inlined legacy file content is fetched below only if needed
+        upload_doc = await uploads_collection.find_one(upload_id, summary=True)
         if not upload_doc:
             raise HTTPException(status_code=404, detail="Upload not found")
         
@@ -148,53 +236,89 @@ async def process_upload(upload_id: str):
         
         # Update status
         await uploads_collection.update(upload_id, {"status": UploadStatus.PROCESSING.value})
+        _evict_cached_responses(upload_id)
         
         # Get metadata
         seller_state_code = upload.metadata.get("seller_state_code", "27")
         
-        # Initialize parser
-        parser = FileParser(seller_state_code=seller_state_code)
-        
         all_invoice_lines = []
         errors = []
         
-        # Process each file
+        # Collect parse tasks; each file is decoded in its own worker process
+        storage_paths = upload.metadata.get("storage_paths", {})
+        stored = [
+            f for f in upload.files
+            if f.detected and f.filename in storage_paths
+        ]
+        # Fetch every stored file concurrently before dispatching the parsers
+        downloads = await asyncio.gather(
+            *(
+                asyncio.to_thread(file_storage.download_file, storage_paths[f.filename])
+                for f in stored
+            ),
+            return_exceptions=True
+        )
+        downloaded = {f.filename: d for f, d in zip(stored, downloads)}
+        
+        # Uploads created before storage paths carried hex content inline
+        legacy_metadata = {}
+        if any(f.detected and f.filename not in storage_paths for f in upload.files):
+            legacy_metadata = (await uploads_collection.find_one(upload_id))["metadata"]
+        
+        tasks = []
         for file_info in upload.files:
             if not file_info.detected:
                 errors.append(f"File {file_info.filename} type not detected, skipping")
                 continue
             
-            try:
-                # Retrieve file content from metadata
-                content_hex = upload.metadata.get(f"file_content_{file_info.filename}")
+            if file_info.filename in downloaded:
+                content = downloaded[file_info.filename]
+                if isinstance(content, Exception):
+                    errors.append(f"Error reading {file_info.filename}: {str(content)}")
+                    continue
+            else:
+                content_hex = legacy_metadata.get(f"file_content_{file_info.filename}")
                 if not content_hex:
                     errors.append(f"File content not found for {file_info.filename}")
                     continue
                 
-                content = bytes.fromhex(content_hex)
-                
-                # Parse file
-                invoice_lines = parser.parse_file(
-                    content,
-                    file_info.filename,
-                    file_info.file_type,
-                    upload_id
+                try:
+                    content = bytes.fromhex(content_hex)
+                except ValueError as e:
+                    errors.append(f"Error parsing {file_info.filename}: {str(e)}")
+                    continue
+            
+            tasks.append((file_info.filename, content, file_info.file_type))
+        
+        loop = asyncio.get_running_loop()
+        pool = get_process_pool()
+        results = await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    pool, parse_file_worker,
+                    seller_state_code, content, filename, file_type, upload_id
                 )
-                
-                all_invoice_lines.extend(invoice_lines)
-                logger.info(f"Parsed {len(invoice_lines)} lines from {file_info.filename}")
-                
-            except Exception as e:
-                error_msg = f"Error parsing {file_info.filename}: {str(e)}"
+                for filename, content, file_type in tasks
+            ),
+            return_exceptions=True
+        )
+        
+        for (filename, _, _), result in zip(tasks, results):
+            if isinstance(result, Exception):
+                error_msg = f"Error parsing {filename}: {str(result)}"
                 errors.append(error_msg)
                 logger.error(error_msg)
+                continue
+            
+            all_invoice_lines.extend(result)
+            logger.info(f"Parsed {len(result)} lines from {filename}")
         
         # Save invoice lines to Supabase
-        if all_invoice_lines:
-            invoice_docs = [line.model_dump(mode='json') for line in all_invoice_lines]
-            # Sanitize float values to prevent JSON serialization errors
-            invoice_docs = [safe_json_response(doc) for doc in invoice_docs]
-            await invoice_lines_collection.insert_many(invoice_docs)
+        # Pydantic's JSON serializer writes NaN/Infinity as null, so one
+        # dump_json/loads pass replaces sanitizing each row in Python; the
+        # client splits the lines into concurrent batches
+        invoice_docs = json.loads(INVOICE_LINE_LIST_ADAPTER.dump_json(all_invoice_lines))
+        await invoice_lines_collection.insert_many(invoice_docs, ordered=False)
         
         # Update upload status
         status = UploadStatus.COMPLETED if not errors else UploadStatus.FAILED
@@ -231,35 +355,52 @@ async def process_upload(upload_id: str):
 
 
 @api_router.post("/generate/{upload_id}")
-async def generate_gstr_json(upload_id: str):
+async def generate_gstr_json(
+    upload_id: str,
+    force: bool = Query(default=False, description="Regenerate even if exports already exist")
+):
     """
     Generate GSTR-1B and GSTR-3B JSON files
     Enhanced with Gemini AI for validation and insights
+    
+    Processed uploads do not change, so repeat calls return the stored
+    exports unless force is set.
     """
     try:
-        # Get upload record
-        upload_doc = await uploads_collection.find_one(upload_id)
+        # Get upload record; only status and metadata are read here
+        upload_doc = await uploads_collection.find_one(upload_id, summary=True)
         if not upload_doc:
             raise HTTPException(status_code=404, detail="Upload not found")
         
-        upload = Upload(**upload_doc)
+        metadata = upload_doc["metadata"]
         
         # Check if processing is complete
-        if upload.status != UploadStatus.COMPLETED:
+        status = upload_doc.get("status")
+        if status != UploadStatus.COMPLETED.value:
             raise HTTPException(
                 status_code=400,
-                detail=f"Upload must be processed first. Current status: {upload.status}"
+                detail=f"Upload must be processed first. Current status: {status}"
             )
         
-        # Get invoice lines
-        invoice_lines = await invoice_lines_collection.find_by_upload(upload_id)
+        if not force:
+            existing = await gstr_exports_collection.find_latest(upload_id)
+            if "GSTR1B" in existing and "GSTR3B" in existing:
+                return fast_json_response({
+                    "upload_id": upload_id,
+                    "gstr1b": existing["GSTR1B"]["json_data"],
+                    "gstr3b": existing["GSTR3B"]["json_data"],
+                    "validation_warnings": existing["GSTR1B"].get("validation_warnings", [])
+                })
+        
+        # Get invoice lines, fetching only the columns the generator uses
+        invoice_lines = await invoice_lines_collection.find_by_upload(upload_id, columns=GENERATOR_COLUMNS)
         
         if not invoice_lines:
             raise HTTPException(status_code=400, detail="No invoice lines found")
         
         # Get metadata
-        gstin = upload.metadata.get("gstin", "27AABCE1234F1Z5")
-        filing_period = upload.metadata.get("filing_period", "012025")
+        gstin = metadata.get("gstin", "27AABCE1234F1Z5")
+        filing_period = metadata.get("filing_period", "012025")
         
         # Use new portal-compliant generator
         portal_generator = PortalCompliantGSTRGenerator(
@@ -294,29 +435,29 @@ async def generate_gstr_json(upload_id: str):
             validation_warnings=warnings
         )
         
-        # Save exports
-        gstr1b_dict = gstr1b_export.model_dump(mode='json')
-        gstr1b_dict = safe_json_response(gstr1b_dict)
-        await gstr_exports_collection.insert(gstr1b_dict)
+        # Sanitize floats for JSON compatibility once; the same dicts are
+        # stored with each export and returned in the response
+        gstr1b_json = safe_json_response(gstr1b_json)
+        gstr3b_json = safe_json_response(gstr3b_json)
         
-        gstr3b_dict = gstr3b_export.model_dump(mode='json')
-        gstr3b_dict = safe_json_response(gstr3b_dict)
-        await gstr_exports_collection.insert(gstr3b_dict)
+        # Save both exports in one round trip
+        gstr1b_dict = gstr1b_export.model_dump(mode='json', exclude={'json_data'})
+        gstr1b_dict['json_data'] = gstr1b_json
+        gstr3b_dict = gstr3b_export.model_dump(mode='json', exclude={'json_data'})
+        gstr3b_dict['json_data'] = gstr3b_json
+        await gstr_exports_collection.insert_many([gstr1b_dict, gstr3b_dict])
+        _evict_cached_responses(upload_id)
         
         logger.info(f"Generated portal-compliant GSTR JSON files for upload {upload_id}")
         
-        response_data = {
+        return fast_json_response({
             "upload_id": upload_id,
             "gstr1b": gstr1b_json,
             "gstr3b": gstr3b_json,
             "validation_warnings": warnings
-        }
-        
-        # Sanitize floats for JSON compatibility
-        return safe_json_response(response_data)
+        })
         
     except Exception as e:
-        import traceback
         logger.error(f"Generation error: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -327,17 +468,22 @@ async def get_downloads(upload_id: str):
     """
     Get available downloads for an upload
     """
+    cache_key = ("downloads", upload_id)
+    if cache_key in RESPONSE_CACHE:
+        return RESPONSE_CACHE[cache_key]
+    
     try:
-        # Get exports
-        exports = await gstr_exports_collection.find_by_upload(upload_id)
+        # Get exports; the JSON itself is served by /download/{upload_id}/{file_type}
+        exports = await gstr_exports_collection.find_by_upload(upload_id, columns=EXPORT_SUMMARY_COLUMNS)
         
         if not exports:
             raise HTTPException(status_code=404, detail="No exports found for this upload")
         
-        return safe_json_response({
+        response = RESPONSE_CACHE[cache_key] = safe_json_response({
             "upload_id": upload_id,
             "exports": exports
         })
+        return response
         
     except Exception as e:
         logger.error(f"Download error: {str(e)}")
@@ -357,48 +503,35 @@ async def download_gstr_file(upload_id: str, file_type: str):
         
         # Get the GSTR data
         export_type = "GSTR1B" if file_type.lower() == 'gstr1b' else "GSTR3B"
-        exports = await gstr_exports_collection.find_by_upload(upload_id)
-        
-        if not exports:
-            raise HTTPException(status_code=404, detail="No exports found for this upload")
-        
-        # Find the specific export
-        export_data = None
-        for export in exports:
-            if export.get('export_type') == export_type:
-                export_data = export.get('json_data')
-                break
+        # Fetch the one export needed and the filing period (for the filename) together
+        export_data, filing_period = await asyncio.gather(
+            gstr_exports_collection.find_latest_json(upload_id, export_type),
+            uploads_collection.find_metadata_value(upload_id, 'filing_period')
+        )
         
         if not export_data:
             raise HTTPException(status_code=404, detail=f"{export_type} not found for this upload")
         
-        # Get filing period for filename
-        upload_doc = await uploads_collection.find_one(upload_id)
-        filing_period = upload_doc.get('metadata', {}).get('filing_period', '012025') if upload_doc else '012025'
+        filing_period = filing_period or '012025'
         
-        # Create JSON string
-        json_string = json.dumps(export_data, indent=2)
+        # Serialize straight to bytes in one pass
+        if HAS_ORJSON:
+            json_bytes = orjson.dumps(export_data, option=orjson.OPT_INDENT_2)
+        else:
+            json_bytes = json.dumps(export_data, indent=2).encode('utf-8')
         
         # Create filename
         filename = f"{export_type}_{filing_period}.json"
         
-        # Convert to bytes
-        json_bytes = json_string.encode('utf-8')
-        
-        # Return as streaming response with proper headers
-        return StreamingResponse(
-            BytesIO(json_bytes),
+        return Response(
+            json_bytes,
             media_type="application/json",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}",
-                "Content-Length": str(len(json_bytes)),
-            }
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        import traceback
         logger.error(f"Download file error: {str(e)}")
         logger.error(f"Traceback: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -410,15 +543,8 @@ async def list_uploads():
     List all uploads
     """
     try:
-        uploads = await uploads_collection.find_all()
-        
-        # Clean up file content from metadata for listing
-        for upload in uploads:
-            if "metadata" in upload:
-                upload["metadata"] = {
-                    k: v for k, v in upload["metadata"].items()
-                    if not k.startswith("file_content_")
-                }
+        # Summary reads leave any inlined file content in the database
+        uploads = await uploads_collection.find_all(summary=True)
         
         return safe_json_response({"uploads": uploads})
         
@@ -432,31 +558,29 @@ async def get_upload_details(upload_id: str):
     """
     Get upload details with processing status
     """
+    cache_key = ("upload", upload_id)
+    if cache_key in RESPONSE_CACHE:
+        return RESPONSE_CACHE[cache_key]
+    
     try:
-        upload_doc = await uploads_collection.find_one(upload_id)
+        upload_doc = await uploads_collection.find_one(upload_id, summary=True)
         if not upload_doc:
             raise HTTPException(status_code=404, detail="Upload not found")
         
-        # Clean up file content from metadata
-        if "metadata" in upload_doc:
-            upload_doc["metadata"] = {
-                k: v for k, v in upload_doc["metadata"].items()
-                if not k.startswith("file_content_")
-            }
-        
         # Get invoice lines count
         invoice_count = await invoice_lines_collection.count(upload_id)
         upload_doc["invoice_lines_count"] = invoice_count
         
-        # Get exports
-        exports = await gstr_exports_collection.find_by_upload(upload_id)
-        # Remove large json_data from list view
-        for export in exports:
-            if 'json_data' in export:
-                del export['json_data']
-        upload_doc["exports"] = exports
+        # Get exports, leaving the large json_data out of the list view
+        upload_doc["exports"] = await gstr_exports_collection.find_by_upload(
+            upload_id, columns=EXPORT_SUMMARY_COLUMNS
+        )
         
-        return safe_json_response(upload_doc)
+        response = safe_json_response(upload_doc)
+        # In-flight statuses are left uncached so polling sees them change
+        if upload_doc.get("status") == UploadStatus.COMPLETED.value:
+            RESPONSE_CACHE[cache_key] = response
+        return response
         
     except Exception as e:
         logger.error(f"Get upload details error: {str(e)}")
@@ -472,14 +596,15 @@ async def get_preview_data(upload_id: str):
     """
     try:
         # Get upload record
-        upload_doc = await uploads_collection.find_one(upload_id)
+        upload_doc = await uploads_collection.find_one(upload_id, summary=True)
         if not upload_doc:
             raise HTTPException(status_code=404, detail="Upload not found")
         
-        # Get invoice lines
-        invoice_lines = await invoice_lines_collection.find_by_upload(upload_id)
+        # Breakdowns are grouped in Postgres; only summary rows come back
+        state_breakdown = await invoice_lines_collection.preview_by_state(upload_id)
+        doc_type_rows = await invoice_lines_collection.preview_by_document_type(upload_id)
         
-        if not invoice_lines:
+        if not state_breakdown and not doc_type_rows:
             return safe_json_response({
                 "upload_id": upload_id,
                 "summary": {},
@@ -487,85 +612,44 @@ async def get_preview_data(upload_id: str):
                 "audit_log": []
             })
         
-        # Categorize data
-        sales_lines = [l for l in invoice_lines if l.get("file_type") in ["tcs_sales", "tcs_sales_return"]]
-        invoice_docs = [l for l in invoice_lines if l.get("file_type") == "tax_invoice"]
-        
-        # Build state-wise breakdown
-        state_breakdown = {}
-        for line in sales_lines:
-            state_code = line.get("state_code", "Unknown")
-            gst_rate = line.get("gst_rate", 0)
-            key = f"{state_code}_{gst_rate}"
-            
-            if key not in state_breakdown:
-                state_breakdown[key] = {
-                    "state_code": state_code,
-                    "state_name": line.get("end_customer_state_new", "Unknown"),
-                    "gst_rate": gst_rate,
-                    "is_intra_state": line.get("is_intra_state", False),
-                    "count": 0,
-                    "taxable_value": 0,
-                    "cgst_amount": 0,
-                    "sgst_amount": 0,
-                    "igst_amount": 0,
-                    "tax_amount": 0
-                }
-            
-            state_breakdown[key]["count"] += 1
-            state_breakdown[key]["taxable_value"] += (line.get("taxable_value") or 0)
-            state_breakdown[key]["cgst_amount"] += (line.get("cgst_amount") or 0)
-            state_breakdown[key]["sgst_amount"] += (line.get("sgst_amount") or 0)
-            state_breakdown[key]["igst_amount"] += (line.get("igst_amount") or 0)
-            state_breakdown[key]["tax_amount"] += (line.get("tax_amount") or 0)
-        
-        # Build document type breakdown
-        doc_type_breakdown = {}
-        for line in invoice_docs:
-            doc_type = line.get("invoice_type", "Invoice")
-            if doc_type not in doc_type_breakdown:
-                doc_type_breakdown[doc_type] = {
-                    "type": doc_type,
-                    "count": 0,
-                    "invoice_numbers": []
-                }
-            doc_type_breakdown[doc_type]["count"] += 1
-            doc_type_breakdown[doc_type]["invoice_numbers"].append(line.get("invoice_no"))
-        
-        # Calculate totals
-        total_taxable = sum((l.get("taxable_value") or 0) for l in sales_lines)
-        total_tax = sum((l.get("tax_amount") or 0) for l in sales_lines)
-        total_cgst = sum((l.get("cgst_amount") or 0) for l in sales_lines)
-        total_sgst = sum((l.get("sgst_amount") or 0) for l in sales_lines)
-        total_igst = sum((l.get("igst_amount") or 0) for l in sales_lines)
+        # Calculate totals from the grouped rows
+        total_transactions = sum(row["count"] for row in state_breakdown)
+        total_documents = sum(row["count"] for row in doc_type_rows)
+        total_taxable = sum(row["taxable_value"] for row in state_breakdown)
+        total_tax = sum(row["tax_amount"] for row in state_breakdown)
+        total_cgst = sum(row["cgst_amount"] for row in state_breakdown)
+        total_sgst = sum(row["sgst_amount"] for row in state_breakdown)
+        total_igst = sum(row["igst_amount"] for row in state_breakdown)
+        unique_states = len(set(row["state_code"] for row in state_breakdown if row["state_code"]))
+        unique_rates = sorted(set(row["gst_rate"] for row in state_breakdown if row["gst_rate"] is not None))
         
         # Audit log
         audit_log = [
-            f"Processed {len(sales_lines)} sales transaction lines",
-            f"Processed {len(invoice_docs)} invoice document entries",
+            f"Processed {total_transactions} sales transaction lines",
+            f"Processed {total_documents} invoice document entries",
             f"Total Taxable Value: ₹{total_taxable:.2f}",
             f"Total Tax: ₹{total_tax:.2f} (CGST: ₹{total_cgst:.2f}, SGST: ₹{total_sgst:.2f}, IGST: ₹{total_igst:.2f})",
-            f"Unique states found: {len(set(l.get('state_code') for l in sales_lines if l.get('state_code')))}",
-            f"Unique GST rates: {sorted(set(l.get('gst_rate') for l in sales_lines if l.get('gst_rate') is not None))}",
-            f"Document types: {list(doc_type_breakdown.keys())}"
+            f"Unique states found: {unique_states}",
+            f"Unique GST rates: {unique_rates}",
+            f"Document types: {[row['type'] for row in doc_type_rows]}"
         ]
         
         return safe_json_response({
             "upload_id": upload_id,
             "summary": {
-                "total_transactions": len(sales_lines),
-                "total_documents": len(invoice_docs),
+                "total_transactions": total_transactions,
+                "total_documents": total_documents,
                 "total_taxable_value": round(total_taxable, 2),
                 "total_tax": round(total_tax, 2),
                 "total_cgst": round(total_cgst, 2),
                 "total_sgst": round(total_sgst, 2),
                 "total_igst": round(total_igst, 2),
-                "unique_states": len(set(l.get('state_code') for l in sales_lines if l.get('state_code'))),
-                "unique_rates": sorted(set(l.get('gst_rate') for l in sales_lines if l.get('gst_rate') is not None))
+                "unique_states": unique_states,
+                "unique_rates": unique_rates
             },
             "breakdown": {
-                "by_state_and_rate": list(state_breakdown.values()),
-                "by_document_type": list(doc_type_breakdown.values())
+                "by_state_and_rate": state_breakdown,
+                "by_document_type": doc_type_rows
             },
             "audit_log": audit_log
         })
@@ -4,7 +4,6 @@ Runs the schema migration to create/update tables
 """
 import os
 from pathlib import Path
-from supabase import create_client
 from dotenv import load_dotenv
 
 ROOT_DIR = Path(__file__).parent
@@ -19,7 +18,8 @@ def setup_tables():
     print("🔧 Setting up Supabase database...")
     print(f"📡 Connecting to: {SUPABASE_URL}")
     
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    from supabase_client import get_supabase_client
+    supabase = get_supabase_client()
     
     # Read the schema file
     schema_file = ROOT_DIR / 'supabase_schema_v2.sql'
@@ -3,8 +3,11 @@ Supabase database client for GST Filing Automation
 Schema-driven GSTR-1 with Canonical Models
 """
 import os
+import asyncio
 import logging
-from supabase import create_client, Client
+from functools import lru_cache
+import httpx
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
 from pathlib import Path
 from typing import Optional, List, Dict, Any
@@ -16,17 +19,70 @@ load_dotenv(ROOT_DIR / '.env')
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
 
+# Rows per insert request, and how many unordered requests may run at once
+INSERT_BATCH_SIZE = int(os.environ.get('INSERT_BATCH_SIZE', '1000'))
+INSERT_CONCURRENCY = int(os.environ.get('INSERT_CONCURRENCY', '4'))
+
 logger = logging.getLogger(__name__)
 
+# One pooled HTTP/2 connection set per client, kept warm between requests
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40, keepalive_expiry=30.0)
+HTTP_TIMEOUT = httpx.Timeout(120.0)
+
+
+def _client_options() -> ClientOptions:
+    """Client options with a keep-alive, HTTP/2 httpx pool"""
+    return ClientOptions(
+        httpx_client=httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    )
+
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Client:
+    """The process-wide Supabase client, created on first use"""
+    client = create_client(SUPABASE_URL, SUPABASE_KEY, options=_client_options())
+    logger.info(f"✅ Supabase client connected to {SUPABASE_URL}")
+    return client
+
+
 # Create Supabase client
 try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    logger.info(f"✅ Supabase client connected to {SUPABASE_URL}")
+    supabase: Client = get_supabase_client()
 except Exception as e:
     logger.error(f"❌ Failed to create Supabase client: {str(e)}")
     raise
 
 
+# Blocking PostgREST requests allowed in flight at once across the process
+REQUEST_CONCURRENCY = int(os.environ.get('SUPABASE_REQUEST_CONCURRENCY', '20'))
+_request_slots = asyncio.Semaphore(REQUEST_CONCURRENCY)
+
+
+async def _run(query):
+    """Execute a PostgREST query in a worker thread, off the event loop"""
+    async with _request_slots:
+        return await asyncio.to_thread(query.execute)
+
+
+async def _insert_batched(client: Client, table: str, rows: list, ordered: bool = True) -> list:
+    """
+    Insert rows in INSERT_BATCH_SIZE chunks and return the inserted rows
+    
+    Each chunk is one PostgREST request run in a worker thread. Unordered
+    inserts keep up to INSERT_CONCURRENCY chunks in flight at once; ordered
+    inserts send them one after another.
+    """
+    chunks = [rows[i:i + INSERT_BATCH_SIZE] for i in range(0, len(rows), INSERT_BATCH_SIZE)]
+    limit = asyncio.Semaphore(1 if ordered else INSERT_CONCURRENCY)
+    
+    async def insert_chunk(chunk):
+        async with limit:
+            return (await _run(client.table(table).insert(chunk))).data
+    
+    results = await asyncio.gather(*(insert_chunk(chunk) for chunk in chunks))
+    return [row for data in results for row in data]
+
+
 async def init_database():
     """
     Initialize Supabase tables if they don't exist
@@ -41,31 +97,75 @@ async def init_database():
     pass
 
 
+# Metadata keys returned by summary reads; legacy rows also carry inlined
+# file_content_* blobs in metadata, which summaries never fetch
+UPLOAD_METADATA_KEYS = ('seller_state_code', 'gstin', 'filing_period', 'storage_paths')
+
+UPLOAD_SUMMARY_COLUMNS = ','.join(
+    ['id', 'user_id', 'upload_date', 'status', 'files', 'processing_errors', 'created_at', 'updated_at']
+    + [f'meta_{key}:metadata->{key}' for key in UPLOAD_METADATA_KEYS]
+)
+
+
+# Rows per PostgREST page when reading invoice lines; matches the server's
+# default max-rows so a full page is never silently truncated
+FIND_PAGE_SIZE = 1000
+
+
+def _fold_metadata(row: dict) -> dict:
+    """Rebuild the metadata dict from the meta_* columns of a summary read"""
+    metadata = {}
+    for key in UPLOAD_METADATA_KEYS:
+        value = row.pop(f'meta_{key}', None)
+        if value is not None:
+            metadata[key] = value
+    row['metadata'] = metadata
+    return row
+
+
 class SupabaseUploads:
     """Handle uploads table operations"""
     
     @staticmethod
     async def create(upload_data: dict):
         """Create new upload record"""
-        result = supabase.table('uploads').insert(upload_data).execute()
+        result = await _run(supabase.table('uploads').insert(upload_data))
         return result.data[0] if result.data else None
     
     @staticmethod
-    async def find_one(upload_id: str):
-        """Find upload by ID"""
-        result = supabase.table('uploads').select('*').eq('id', upload_id).execute()
-        return result.data[0] if result.data else None
+    async def find_one(upload_id: str, summary: bool = False):
+        """
+        Find upload by ID
+        
+        With summary=True only known metadata keys are selected, so file
+        contents inlined by older uploads are not transferred.
+        """
+        columns = UPLOAD_SUMMARY_COLUMNS if summary else '*'
+        result = await _run(supabase.table('uploads').select(columns).eq('id', upload_id))
+        if not result.data:
+            return None
+        return _fold_metadata(result.data[0]) if summary else result.data[0]
     
     @staticmethod
     async def update(upload_id: str, update_data: dict):
         """Update upload record"""
-        result = supabase.table('uploads').update(update_data).eq('id', upload_id).execute()
+        result = await _run(supabase.table('uploads').update(update_data).eq('id', upload_id))
         return result.data[0] if result.data else None
     
     @staticmethod
-    async def find_all(limit: int = 100):
-        """Get all uploads"""
-        result = supabase.table('uploads').select('*').order('upload_date', desc=True).limit(limit).execute()
+    async def find_metadata_value(upload_id: str, key: str):
+        """One metadata entry of an upload, or None"""
+        query = supabase.table('uploads').select(f'value:metadata->{key}').eq('id', upload_id)
+        result = await _run(query)
+        return result.data[0]['value'] if result.data else None
+    
+    @staticmethod
+    async def find_all(limit: int = 100, summary: bool = False):
+        """Get all uploads; summary=True as in find_one"""
+        columns = UPLOAD_SUMMARY_COLUMNS if summary else '*'
+        result = await _run(supabase.table('uploads').select(columns).order('upload_date', desc=True).limit(limit))
+        if summary:
+            return [_fold_metadata(row) for row in result.data]
         return result.data
 
 
@@ -73,24 +173,55 @@ class SupabaseInvoiceLines:
     """Handle invoice_lines table operations"""
     
     @staticmethod
-    async def insert_many(invoice_lines: list):
-        """Insert multiple invoice lines"""
+    async def insert_many(invoice_lines: list, ordered: bool = True):
+        """
+        Insert multiple invoice lines
+        
+        Lines are sent in bounded batches; with ordered=False the batches
+        are inserted concurrently, as with the MongoDB wrapper.
+        """
         if not invoice_lines:
             return []
-        result = supabase.table('invoice_lines').insert(invoice_lines).execute()
-        return result.data
+        return await _insert_batched(supabase, 'invoice_lines', invoice_lines, ordered=ordered)
     
     @staticmethod
-    async def find_by_upload(upload_id: str):
-        """Find all invoice lines for an upload"""
-        result = supabase.table('invoice_lines').select('*').eq('upload_id', upload_id).execute()
-        return result.data
+    async def find_by_upload(upload_id: str, columns: str = '*'):
+        """
+        Find all invoice lines for an upload, optionally only some columns
+        
+        PostgREST caps each response at 1000 rows, so lines are read in
+        id-ordered pages until a short page comes back.
+        """
+        lines = []
+        while True:
+            page = (await _run(
+                supabase.table('invoice_lines')
+                .select(columns)
+                .eq('upload_id', upload_id)
+                .order('id')
+                .range(len(lines), len(lines) + FIND_PAGE_SIZE - 1)
+            )).data
+            lines.extend(page)
+            if len(page) < FIND_PAGE_SIZE:
+                return lines
     
     @staticmethod
     async def count(upload_id: str):
         """Count invoice lines for an upload"""
-        result = supabase.table('invoice_lines').select('id', count='exact').eq('upload_id', upload_id).execute()
+        result = await _run(supabase.table('invoice_lines').select('id', count='exact').eq('upload_id', upload_id))
         return result.count
+    
+    @staticmethod
+    async def preview_by_state(upload_id: str):
+        """Sales lines summed per (state_code, gst_rate), grouped in Postgres"""
+        result = await _run(supabase.rpc('gstr_preview_by_state', {'p_upload_id': upload_id}))
+        return result.data
+    
+    @staticmethod
+    async def preview_by_document_type(upload_id: str):
+        """Tax invoice counts and numbers per document type, grouped in Postgres"""
+        result = await _run(supabase.rpc('gstr_preview_by_document_type', {'p_upload_id': upload_id}))
+        return result.data
 
 
 class SupabaseGSTRExports:
@@ -99,17 +230,78 @@ class SupabaseGSTRExports:
     @staticmethod
     async def insert(export_data: dict):
         """Insert GSTR export"""
-        result = supabase.table('gstr_exports').insert(export_data).execute()
+        result = await _run(supabase.table('gstr_exports').insert(export_data))
         return result.data[0] if result.data else None
     
     @staticmethod
-    async def find_by_upload(upload_id: str):
-        """Find all exports for an upload"""
-        result = supabase.table('gstr_exports').select('*').eq('upload_id', upload_id).execute()
+    async def insert_many(exports: list):
+        """Insert several GSTR exports in one request"""
+        if not exports:
+            return []
+        result = await _run(supabase.table('gstr_exports').insert(exports))
+        return result.data
+    
+    @staticmethod
+    async def find_by_upload(upload_id: str, columns: str = '*'):
+        """Find all exports for an upload, optionally only some columns"""
+        result = await _run(supabase.table('gstr_exports').select(columns).eq('upload_id', upload_id))
         return result.data
+    
+    @staticmethod
+    async def find_latest_json(upload_id: str, export_type: str) -> Optional[dict]:
+        """json_data of the most recent export of one type, or None"""
+        query = (
+            supabase.table('gstr_exports')
+            .select('json_data')
+            .eq('upload_id', upload_id)
+            .eq('export_type', export_type)
+            .order('export_date', desc=True)
+            .limit(1)
+        )
+        result = await _run(query)
+        return result.data[0]['json_data'] if result.data else None
+    
+    @staticmethod
+    async def find_latest(upload_id: str) -> Dict[str, dict]:
+        """Most recent export of each type for an upload, keyed by export_type"""
+        result = await _run(
+            supabase.table('gstr_exports')
+            .select('*')
+            .eq('upload_id', upload_id)
+            .order('export_date', desc=True)
+        )
+        latest = {}
+        for export in result.data:
+            latest.setdefault(export['export_type'], export)
+        return latest
+
+
+class SupabaseStorage:
+    """Handle raw upload file storage"""
+    
+    BUCKET_NAME = "gst-uploads"
+    
+    @staticmethod
+    def upload_file(storage_path: str, file_content: bytes, content_type: str = "application/octet-stream"):
+        """Store raw file bytes under storage_path"""
+        supabase.storage.from_(SupabaseStorage.BUCKET_NAME).upload(
+            storage_path,
+            file_content,
+            {
+                "content-type": content_type,
+                "upsert": "true"
+            }
+        )
+        return storage_path
+    
+    @staticmethod
+    def download_file(storage_path: str) -> bytes:
+        """Fetch raw file bytes stored under storage_path"""
+        return supabase.storage.from_(SupabaseStorage.BUCKET_NAME).download(storage_path)
 
 
 # Export instances
 uploads_collection = SupabaseUploads()
 invoice_lines_collection = SupabaseInvoiceLines()
 gstr_exports_collection = SupabaseGSTRExports()
+file_storage = SupabaseStorage()
@@ -2,8 +2,15 @@
 Enhanced Supabase client with Auth, Storage, and Realtime support
 """
 import os
+import io
+import copy
+import json
+import asyncio
 import logging
-from supabase import create_client, Client
+from functools import lru_cache
+from cachetools import TTLCache
+import httpx
+from supabase import create_client, Client, ClientOptions
 from dotenv import load_dotenv
 from pathlib import Path
 from typing import Optional, List, Dict, Any
@@ -17,15 +24,77 @@ SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
 SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_KEY', SUPABASE_KEY)  # Use service role key if available
 
+# Owner recorded on rows written without a signed-in user (backward compatibility)
+DEFAULT_USER_ID = '00000000-0000-0000-0000-000000000001'
+
+# Rows per insert request, and how many unordered requests may run at once
+INSERT_BATCH_SIZE = int(os.environ.get('INSERT_BATCH_SIZE', '1000'))
+INSERT_CONCURRENCY = int(os.environ.get('INSERT_CONCURRENCY', '4'))
+
+# Rows per read request; PostgREST caps responses at 1000 rows by default
+FIND_PAGE_SIZE = int(os.environ.get('FIND_PAGE_SIZE', '1000'))
+
+# Optional COPY ingest for invoice lines over a direct Postgres connection
+USE_COPY_INGEST = os.environ.get('USE_COPY_INGEST') == '1'
+SUPABASE_DB_URL = os.environ.get('SUPABASE_DB_URL')
+
 logger = logging.getLogger(__name__)
 
+try:
+    from psycopg2 import sql
+    from psycopg2.pool import ThreadedConnectionPool
+    HAS_PSYCOPG2 = True
+except ImportError:
+    logger.warning("⚠️ psycopg2 not available, invoice lines are inserted through PostgREST only")
+    HAS_PSYCOPG2 = False
+
+# Upload rows by id, held only once processing has finished; update()/delete()
+# evict in this process, and in-flight rows are never cached so polls on other
+# workers see status changes immediately
+_upload_cache: TTLCache = TTLCache(maxsize=1024, ttl=30)
+_CACHEABLE_UPLOAD_STATUSES = frozenset({'completed', 'failed'})
+
+# Export lists keyed ('upload', upload_id, ...) or ('user', user_id, ...).
+# Evicted by SupabaseGSTRExports.insert in this process; other workers
+# may serve a list up to one TTL old
+_exports_cache: TTLCache = TTLCache(maxsize=256, ttl=60)
+
+# One pooled HTTP/2 connection set per client, kept warm between requests
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=20, max_connections=40, keepalive_expiry=30.0)
+HTTP_TIMEOUT = httpx.Timeout(120.0)
+
+
+def _client_options() -> ClientOptions:
+    """Client options with a keep-alive, HTTP/2 httpx pool"""
+    return ClientOptions(
+        httpx_client=httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+    )
+
+
+@lru_cache(maxsize=1)
+def get_supabase_client() -> Client:
+    """The process-wide client for authenticated requests, created on first use"""
+    return create_client(SUPABASE_URL, SUPABASE_KEY, options=_client_options())
+
+
+@lru_cache(maxsize=1)
+def get_supabase_admin_client() -> Client:
+    """
+    The process-wide service role client (bypasses RLS), created on first use
+    
+    Always a separate instance: signing in on the regular client rebinds
+    its PostgREST auth header to that user's session.
+    """
+    return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY, options=_client_options())
+
+
 # Create Supabase clients
 try:
     # Regular client for authenticated requests
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    supabase: Client = get_supabase_client()
     
     # Service role client for admin operations (bypasses RLS)
-    supabase_admin: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+    supabase_admin: Client = get_supabase_admin_client()
     
     logger.info(f"✅ Supabase clients connected to {SUPABASE_URL}")
 except Exception as e:
@@ -33,6 +102,78 @@ except Exception as e:
     raise
 
 
+# Blocking PostgREST requests allowed in flight at once across the process
+REQUEST_CONCURRENCY = int(os.environ.get('SUPABASE_REQUEST_CONCURRENCY', '20'))
+_request_slots = asyncio.Semaphore(REQUEST_CONCURRENCY)
+
+
+async def _run(query):
+    """Execute a PostgREST query in a worker thread, off the event loop"""
+    async with _request_slots:
+        return await asyncio.to_thread(query.execute)
+
+
+async def _insert_batched(client: Client, table: str, rows: list, ordered: bool = True) -> list:
+    """
+    Insert rows in INSERT_BATCH_SIZE chunks and return the inserted rows
+    
+    Each chunk is one PostgREST request run in a worker thread. Unordered
+    inserts keep up to INSERT_CONCURRENCY chunks in flight at once; ordered
+    inserts send them one after another.
+    """
+    chunks = [rows[i:i + INSERT_BATCH_SIZE] for i in range(0, len(rows), INSERT_BATCH_SIZE)]
+    limit = asyncio.Semaphore(1 if ordered else INSERT_CONCURRENCY)
+    
+    async def insert_chunk(chunk):
+        async with limit:
+            return (await _run(client.table(table).insert(chunk))).data
+    
+    results = await asyncio.gather(*(insert_chunk(chunk) for chunk in chunks))
+    return [row for data in results for row in data]
+
+
+# Connections open lazily; at most INSERT_CONCURRENCY COPYs run at once
+_copy_pool = (
+    ThreadedConnectionPool(0, INSERT_CONCURRENCY, SUPABASE_DB_URL)
+    if USE_COPY_INGEST and HAS_PSYCOPG2 and SUPABASE_DB_URL else None
+)
+_copy_slots = asyncio.Semaphore(INSERT_CONCURRENCY)
+
+
+def _copy_text(value) -> str:
+    """One field in COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def _copy_rows(table: str, rows: list) -> None:
+    """
+    COPY rows into a table in one statement (blocking)
+    
+    Skips PostgREST's JSON parsing and per-row INSERT entirely. Columns are
+    taken from the first row, so every row must carry the same keys.
+    """
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_text(row.get(column)) for column in columns))
+        buffer.write('\n')
+    buffer.seek(0)
+    
+    conn = _copy_pool.getconn()
+    try:
+        with conn, conn.cursor() as cur:
+            statement = sql.SQL('COPY {} ({}) FROM STDIN').format(
+                sql.Identifier(table), sql.SQL(', ').join(map(sql.Identifier, columns))
+            )
+            cur.copy_expert(statement.as_string(conn), buffer)
+    finally:
+        _copy_pool.putconn(conn)
+
+
 class SupabaseAuth:
     """Handle Supabase authentication operations"""
     
@@ -171,38 +312,53 @@ class SupabaseUploads:
             upload_data['user_id'] = user_id
         else:
             # Use default UUID for backward compatibility
-            upload_data['user_id'] = '00000000-0000-0000-0000-000000000001'
-        result = supabase_admin.table('uploads').insert(upload_data).execute()
+            upload_data['user_id'] = DEFAULT_USER_ID
+        result = await _run(supabase_admin.table('uploads').insert(upload_data))
         return result.data[0] if result.data else None
     
     @staticmethod
     async def find_one(upload_id: str):
-        """Find upload by ID"""
-        result = supabase_admin.table('uploads').select('*').eq('id', upload_id).execute()
-        return result.data[0] if result.data else None
+        """
+        Find upload by ID
+        
+        Completed and failed rows are cached for 30 seconds. Callers get their
+        own copy, since several of them edit the returned metadata in place.
+        """
+        row = _upload_cache.get(upload_id)
+        if row is None:
+            result = await _run(supabase_admin.table('uploads').select('*').eq('id', upload_id))
+            if not result.data:
+                return None
+            row = result.data[0]
+            if row.get('status') not in _CACHEABLE_UPLOAD_STATUSES:
+                return row
+            _upload_cache[upload_id] = row
+        return copy.deepcopy(row)
     
     @staticmethod
-    async def find_by_user(user_id: str, limit: int = 100):
+    async def find_by_user(user_id: str, limit: int = 100, columns: str = '*'):
         """Find uploads by user"""
-        result = supabase_admin.table('uploads').select('*').eq('user_id', user_id).order('upload_date', desc=True).limit(limit).execute()
+        result = await _run(supabase_admin.table('uploads').select(columns).eq('user_id', user_id).order('upload_date', desc=True).limit(limit))
         return result.data
     
     @staticmethod
     async def update(upload_id: str, update_data: dict):
         """Update upload record"""
-        result = supabase_admin.table('uploads').update(update_data).eq('id', upload_id).execute()
+        result = await _run(supabase_admin.table('uploads').update(update_data).eq('id', upload_id))
+        _upload_cache.pop(upload_id, None)
         return result.data[0] if result.data else None
     
     @staticmethod
-    async def find_all(limit: int = 100):
+    async def find_all(limit: int = 100, columns: str = '*'):
         """Get all uploads (admin only)"""
-        result = supabase_admin.table('uploads').select('*').order('upload_date', desc=True).limit(limit).execute()
+        result = await _run(supabase_admin.table('uploads').select(columns).order('upload_date', desc=True).limit(limit))
         return result.data
     
     @staticmethod
     async def delete(upload_id: str):
         """Delete upload (cascade deletes related records)"""
-        result = supabase_admin.table('uploads').delete().eq('id', upload_id).execute()
+        result = await _run(supabase_admin.table('uploads').delete().eq('id', upload_id))
+        _upload_cache.pop(upload_id, None)
         return result.data
 
 
@@ -210,36 +366,75 @@ class SupabaseInvoiceLines:
     """Handle invoice_lines table operations"""
     
     @staticmethod
-    async def insert_many(invoice_lines: list, user_id: str = None):
-        """Insert multiple invoice lines"""
+    async def insert_many(invoice_lines: list, user_id: str = None, ordered: bool = True):
+        """
+        Insert multiple invoice lines
+        
+        Lines are sent in bounded batches; with ordered=False the batches
+        are inserted concurrently, as with the MongoDB wrapper. With
+        USE_COPY_INGEST=1 and SUPABASE_DB_URL set, they are COPYed instead.
+        """
         if not invoice_lines:
             return []
         
-        # Add user_id to each line (default if not provided)
-        default_user_id = '00000000-0000-0000-0000-000000000001'
+        # Add user_id to each line (default if not provided); resolved once,
+        # since every row of a PostgREST bulk insert must carry the column
+        owner = user_id or DEFAULT_USER_ID
         for line in invoice_lines:
-            line['user_id'] = user_id if user_id else default_user_id
+            line['user_id'] = owner
         
-        result = supabase_admin.table('invoice_lines').insert(invoice_lines).execute()
-        return result.data
+        if _copy_pool is not None:
+            async with _copy_slots:
+                await asyncio.to_thread(_copy_rows, 'invoice_lines', invoice_lines)
+            return invoice_lines
+        
+        return await _insert_batched(supabase_admin, 'invoice_lines', invoice_lines, ordered=ordered)
     
     @staticmethod
-    async def find_by_upload(upload_id: str):
-        """Find all invoice lines for an upload"""
-        result = supabase_admin.table('invoice_lines').select('*').eq('upload_id', upload_id).execute()
-        return result.data
+    async def iter_by_upload(upload_id: str, columns: str = '*', page_size: int = FIND_PAGE_SIZE):
+        """
+        Yield an upload's invoice lines one id-ordered page at a time
+        
+        Pages are keyed on the last id seen rather than an offset, so each
+        request is an index range scan however deep into the upload it is.
+        The id column is always selected because the next page needs it.
+        """
+        if columns != '*' and 'id' not in columns.split(','):
+            columns = f'id,{columns}'
+        last_id = None
+        while True:
+            query = supabase_admin.table('invoice_lines').select(columns).eq('upload_id', upload_id)
+            if last_id is not None:
+                query = query.gt('id', last_id)
+            page = (await _run(query.order('id').limit(page_size))).data
+            for row in page:
+                yield row
+            if len(page) < page_size:
+                return
+            last_id = page[-1]['id']
+    
+    @staticmethod
+    async def find_by_upload(upload_id: str, columns: str = '*'):
+        """Find all invoice lines for an upload, optionally only some columns"""
+        return [row async for row in SupabaseInvoiceLines.iter_by_upload(upload_id, columns)]
     
     @staticmethod
-    async def find_by_user(user_id: str, limit: int = 1000):
+    async def find_by_user(user_id: str, limit: int = 1000, columns: str = '*'):
         """Find invoice lines by user"""
-        result = supabase_admin.table('invoice_lines').select('*').eq('user_id', user_id).limit(limit).execute()
+        result = await _run(supabase_admin.table('invoice_lines').select(columns).eq('user_id', user_id).limit(limit))
         return result.data
     
     @staticmethod
     async def count(upload_id: str):
         """Count invoice lines for an upload"""
-        result = supabase_admin.table('invoice_lines').select('id', count='exact').eq('upload_id', upload_id).execute()
+        result = await _run(supabase_admin.table('invoice_lines').select('id', count='exact').eq('upload_id', upload_id))
         return result.count
+    
+    @staticmethod
+    async def aggregate_preview(upload_id: str):
+        """Per-section line counts and amount totals, grouped in Postgres"""
+        result = await _run(supabase_admin.rpc('gstr_preview_by_section', {'p_upload_id': upload_id}))
+        return result.data
 
 
 class SupabaseGSTRExports:
@@ -252,21 +447,44 @@ class SupabaseGSTRExports:
         if user_id:
             export_data['user_id'] = user_id
         else:
-            export_data['user_id'] = '00000000-0000-0000-0000-000000000001'
-        result = supabase_admin.table('gstr_exports').insert(export_data).execute()
+            export_data['user_id'] = DEFAULT_USER_ID
+        result = await _run(supabase_admin.table('gstr_exports').insert(export_data))
+        SupabaseGSTRExports._evict(export_data.get('upload_id'), export_data['user_id'])
         return result.data[0] if result.data else None
     
     @staticmethod
-    async def find_by_upload(upload_id: str):
-        """Find all exports for an upload"""
-        result = supabase_admin.table('gstr_exports').select('*').eq('upload_id', upload_id).execute()
-        return result.data
+    def _evict(upload_id: str, user_id: str):
+        """Drop cached export lists for an upload and its owner"""
+        stale = (('upload', upload_id), ('user', user_id))
+        for key in [key for key in _exports_cache if key[:2] in stale]:
+            _exports_cache.pop(key, None)
     
     @staticmethod
-    async def find_by_user(user_id: str, limit: int = 100):
-        """Find exports by user"""
-        result = supabase_admin.table('gstr_exports').select('*').eq('user_id', user_id).limit(limit).execute()
-        return result.data
+    async def find_by_upload(upload_id: str, columns: str = '*'):
+        """
+        Find all exports for an upload, optionally only some columns
+        
+        Non-empty results are cached for a minute; callers share the rows
+        and must not modify them.
+        """
+        key = ('upload', upload_id, columns)
+        exports = _exports_cache.get(key)
+        if exports is None:
+            exports = (await _run(supabase_admin.table('gstr_exports').select(columns).eq('upload_id', upload_id))).data
+            if exports:
+                _exports_cache[key] = exports
+        return list(exports)
+    
+    @staticmethod
+    async def find_by_user(user_id: str, limit: int = 100, columns: str = '*'):
+        """Find exports by user (cached like find_by_upload)"""
+        key = ('user', user_id, limit, columns)
+        exports = _exports_cache.get(key)
+        if exports is None:
+            exports = (await _run(supabase_admin.table('gstr_exports').select(columns).eq('user_id', user_id).limit(limit))).data
+            if exports:
+                _exports_cache[key] = exports
+        return list(exports)
 
 
 class SupabaseDocumentRanges:
@@ -282,13 +500,12 @@ class SupabaseDocumentRanges:
             for r in ranges:
                 r['user_id'] = user_id
         
-        result = supabase_admin.table('document_ranges').insert(ranges).execute()
-        return result.data
+        return await _insert_batched(supabase_admin, 'document_ranges', ranges, ordered=False)
     
     @staticmethod
-    async def find_by_upload(upload_id: str):
+    async def find_by_upload(upload_id: str, columns: str = '*'):
         """Find all document ranges for an upload"""
-        result = supabase_admin.table('document_ranges').select('*').eq('upload_id', upload_id).execute()
+        result = await _run(supabase_admin.table('document_ranges').select(columns).eq('upload_id', upload_id))
         return result.data
 
 
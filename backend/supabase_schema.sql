@@ -54,8 +54,12 @@ CREATE INDEX IF NOT EXISTS idx_uploads_user_id ON uploads(user_id);
 CREATE INDEX IF NOT EXISTS idx_uploads_upload_date ON uploads(upload_date DESC);
 CREATE INDEX IF NOT EXISTS idx_invoice_lines_upload_id ON invoice_lines(upload_id);
 CREATE INDEX IF NOT EXISTS idx_invoice_lines_file_type ON invoice_lines(file_type);
+-- Lets gstr_preview_by_state find and group an upload's lines in index order
+CREATE INDEX IF NOT EXISTS idx_invoice_lines_upload_state_rate ON invoice_lines(upload_id, state_code, gst_rate);
 CREATE INDEX IF NOT EXISTS idx_gstr_exports_upload_id ON gstr_exports(upload_id);
 CREATE INDEX IF NOT EXISTS idx_gstr_exports_export_type ON gstr_exports(export_type);
+-- Serves the latest-export-per-type lookup in /generate
+CREATE INDEX IF NOT EXISTS idx_gstr_exports_upload_date ON gstr_exports(upload_id, export_date DESC);
 
 -- Add updated_at trigger for uploads
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -69,6 +73,58 @@ $$ language 'plpgsql';
 CREATE TRIGGER update_uploads_updated_at BEFORE UPDATE ON uploads
 FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- /preview aggregates: one row per state and rate for sales lines, and one
+-- row per document type for tax invoices, grouped in Postgres so the API
+-- never pulls individual invoice lines. Lines of one insert share created_at
+-- (DEFAULT NOW(), batches run concurrently), so id breaks the ties
+CREATE OR REPLACE FUNCTION gstr_preview_by_state(p_upload_id TEXT)
+RETURNS TABLE (
+    state_code TEXT,
+    state_name TEXT,
+    gst_rate NUMERIC,
+    is_intra_state BOOLEAN,
+    count BIGINT,
+    taxable_value NUMERIC,
+    cgst_amount NUMERIC,
+    sgst_amount NUMERIC,
+    igst_amount NUMERIC,
+    tax_amount NUMERIC
+) AS $$
+    SELECT
+        state_code,
+        (array_agg(end_customer_state_new ORDER BY created_at, id))[1],
+        gst_rate,
+        (array_agg(is_intra_state ORDER BY created_at, id))[1],
+        COUNT(*),
+        COALESCE(SUM(taxable_value), 0),
+        COALESCE(SUM(cgst_amount), 0),
+        COALESCE(SUM(sgst_amount), 0),
+        COALESCE(SUM(igst_amount), 0),
+        COALESCE(SUM(tax_amount), 0)
+    FROM invoice_lines
+    WHERE upload_id = p_upload_id
+      AND file_type IN ('tcs_sales', 'tcs_sales_return')
+    GROUP BY state_code, gst_rate
+    ORDER BY MIN(created_at), state_code, gst_rate
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION gstr_preview_by_document_type(p_upload_id TEXT)
+RETURNS TABLE (
+    type TEXT,
+    count BIGINT,
+    invoice_numbers TEXT[]
+) AS $$
+    SELECT
+        COALESCE(invoice_type, 'Invoice'),
+        COUNT(*),
+        array_agg(invoice_no ORDER BY created_at, id)
+    FROM invoice_lines
+    WHERE upload_id = p_upload_id
+      AND file_type = 'tax_invoice'
+    GROUP BY COALESCE(invoice_type, 'Invoice')
+    ORDER BY MIN(created_at), 1
+$$ LANGUAGE sql STABLE;
+
 -- Enable Row Level Security (RLS) - Optional but recommended
 ALTER TABLE uploads ENABLE ROW LEVEL SECURITY;
 ALTER TABLE invoice_lines ENABLE ROW LEVEL SECURITY;
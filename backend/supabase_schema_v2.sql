@@ -149,6 +149,29 @@ DROP TRIGGER IF EXISTS update_uploads_updated_at ON uploads;
 CREATE TRIGGER update_uploads_updated_at BEFORE UPDATE ON uploads
 FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- /preview totals: one row per GSTR section, summed in Postgres so the API
+-- never pages individual invoice lines
+CREATE OR REPLACE FUNCTION gstr_preview_by_section(p_upload_id TEXT)
+RETURNS TABLE (
+    gstr_section TEXT,
+    count BIGINT,
+    taxable_value NUMERIC,
+    cgst_amount NUMERIC,
+    sgst_amount NUMERIC,
+    igst_amount NUMERIC
+) AS $$
+    SELECT
+        gstr_section,
+        COUNT(*),
+        COALESCE(SUM(taxable_value), 0),
+        COALESCE(SUM((computed_tax->>'cgst_amount')::NUMERIC), 0),
+        COALESCE(SUM((computed_tax->>'sgst_amount')::NUMERIC), 0),
+        COALESCE(SUM((computed_tax->>'igst_amount')::NUMERIC), 0)
+    FROM invoice_lines
+    WHERE upload_id = p_upload_id
+    GROUP BY gstr_section
+$$ LANGUAGE sql STABLE;
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE uploads ENABLE ROW LEVEL SECURITY;
 ALTER TABLE invoice_lines ENABLE ROW LEVEL SECURITY;
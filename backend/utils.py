@@ -1,12 +1,18 @@
 import re
 import math
+from functools import lru_cache
+from itertools import islice
+from types import MappingProxyType
 from decimal import Decimal, ROUND_HALF_UP
 from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
 from models import FileType
 
 
-# State name to state code mapping
-STATE_CODE_MAPPING = {
+# State name to state code mapping (read-only; built once at import)
+STATE_CODE_MAPPING = MappingProxyType({
     "andhra pradesh": "37",
     "arunachal pradesh": "12",
     "assam": "18",
@@ -43,11 +49,22 @@ STATE_CODE_MAPPING = {
     "ladakh": "38",
     "lakshadweep": "31",
     "puducherry": "34",
-}
+})
 
 
+# First word of each state name -> (full name, code); every first word is unique
+_STATE_BY_FIRST_WORD = MappingProxyType({
+    name.split()[0]: (name, code) for name, code in STATE_CODE_MAPPING.items()
+})
+_LEADING_WORD = re.compile(r'[a-z]+')
+
+# Invoice number split into prefix and trailing serial (up to 10 digits)
+INVOICE_SERIAL_PATTERN = re.compile(r'^(.*?)(\d{1,10})$')
+
+
+@lru_cache(maxsize=4096)
 def normalize_state_to_code(state_name: str) -> Optional[str]:
-    """Convert state name to state code"""
+    """Convert state name to state code (memoized; the partial match scans every state)"""
     if not state_name:
         return None
     
@@ -58,6 +75,13 @@ def normalize_state_to_code(state_name: str) -> Optional[str]:
     if normalized in STATE_CODE_MAPPING:
         return STATE_CODE_MAPPING[normalized]
     
+    # Addresses usually lead with the state ("maharashtra 400001")
+    leading = _LEADING_WORD.match(normalized)
+    if leading:
+        entry = _STATE_BY_FIRST_WORD.get(leading.group())
+        if entry and normalized.startswith(entry[0]):
+            return entry[1]
+    
     # Try partial match
     for state, code in STATE_CODE_MAPPING.items():
         if state in normalized or normalized in state:
@@ -66,27 +90,42 @@ def normalize_state_to_code(state_name: str) -> Optional[str]:
     return None
 
 
+# Filename substrings per file type, in priority order: each alternative is a
+# lookahead from the start, so a return beats a sale wherever they appear.
+# Group names are FileType values
+FILENAME_FILE_TYPE_PATTERN = re.compile(
+    r"(?=.*(?P<tcs_sales_return>tcs_sales_return|sales_return))"
+    r"|(?=.*(?P<tcs_sales>tcs_sales))"
+    r"|(?=.*(?P<tax_invoice>tax_invoice|invoice_details))",
+    re.DOTALL
+)
+
+# Headers every TCS sales / sales return sheet carries
+TCS_SALES_COLUMNS = frozenset({"gst_rate", "total_taxable_sale_value"})
+
+
 def detect_file_type(filename: str, columns: List[str]) -> FileType:
     """Auto-detect file type based on filename and columns"""
     filename_lower = filename.lower()
     
     # Check by filename patterns
-    if "tcs_sales_return" in filename_lower or "sales_return" in filename_lower:
-        return FileType.TCS_SALES_RETURN
-    elif "tcs_sales" in filename_lower:
-        return FileType.TCS_SALES
-    elif "tax_invoice" in filename_lower or "invoice_details" in filename_lower:
-        return FileType.TAX_INVOICE
+    match = FILENAME_FILE_TYPE_PATTERN.match(filename_lower)
+    if match:
+        return FileType(match.lastgroup)
     
     # Check by column headers
-    columns_lower = [col.lower() for col in columns]
+    columns_lower = {col.lower() for col in columns}
     
     # Tax invoice typically has "Type" and "Invoice No." columns
-    if any("type" in col for col in columns_lower) and any("invoice" in col and "no" in col for col in columns_lower):
+    has_type = has_invoice_no = False
+    for col in columns_lower:
+        has_type = has_type or "type" in col
+        has_invoice_no = has_invoice_no or ("invoice" in col and "no" in col)
+    if has_type and has_invoice_no:
         return FileType.TAX_INVOICE
     
     # TCS sales and returns have gst_rate and total_taxable_sale_value
-    if "gst_rate" in columns_lower and "total_taxable_sale_value" in columns_lower:
+    if TCS_SALES_COLUMNS <= columns_lower:
         if "return" in filename_lower:
             return FileType.TCS_SALES_RETURN
         return FileType.TCS_SALES
@@ -94,30 +133,48 @@ def detect_file_type(filename: str, columns: List[str]) -> FileType:
     return FileType.UNKNOWN
 
 
+# Decimal constants shared by the exact tax and grouping paths
+_ZERO = Decimal("0")
+_TWO = Decimal("2")
+_HUNDRED = Decimal("100")
+_PAISA = Decimal("0.01")
+
+
+def _to_decimal(value) -> Decimal:
+    """Decimal of a stored amount; ints convert directly, floats via their shortest repr"""
+    if isinstance(value, (int, Decimal)):
+        return Decimal(value)
+    return Decimal(str(value))
+
+
 def compute_tax_split(taxable_value: float, gst_rate: float, seller_state: str, customer_state: str) -> Dict[str, float]:
     """
     Compute CGST/SGST/IGST split based on intra-state or inter-state transaction
     Uses Decimal for precise calculations
+    
+    Meant for one-off checks; whole files go through
+    parser_kernels.compute_tax_split_bulk, which matches this for non-negative
+    taxable values with up to six decimal places.
     """
-    taxable = Decimal(str(taxable_value))
-    rate = Decimal(str(gst_rate))
+    taxable = _to_decimal(taxable_value)
+    rate = _to_decimal(gst_rate)
     
     # Calculate total tax
-    tax_amount = (taxable * rate / Decimal("100")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+    tax_amount = (taxable * rate / _HUNDRED).quantize(_PAISA, rounding=ROUND_HALF_UP)
     
     # Determine if intra-state or inter-state
     is_intra_state = seller_state == customer_state
     
     if is_intra_state:
         # Split equally between CGST and SGST
-        cgst = (tax_amount / Decimal("2")).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        cgst = (tax_amount / _TWO).quantize(_PAISA, rounding=ROUND_HALF_UP)
         sgst = tax_amount - cgst  # Remaining to avoid rounding issues
-        igst = Decimal("0")
+        igst = _ZERO
     else:
         # All goes to IGST
         igst = tax_amount
-        cgst = Decimal("0")
-        sgst = Decimal("0")
+        cgst = _ZERO
+        sgst = _ZERO
     
     return {
         "tax_amount": float(tax_amount),
@@ -128,11 +185,14 @@ def compute_tax_split(taxable_value: float, gst_rate: float, seller_state: str,
     }
 
 
+@lru_cache(maxsize=1 << 16)
 def extract_invoice_serial(invoice_no: str) -> Tuple[Optional[str], Optional[int]]:
     """
     Extract prefix and numeric serial from invoice number
     Returns (prefix, serial_number)
     Example: "INV-2024-001" -> ("INV-2024-", 1)
+    
+    Memoized, since the same invoice number recurs across a merged upload.
     """
     if not invoice_no:
         return None, None
@@ -140,8 +200,18 @@ def extract_invoice_serial(invoice_no: str) -> Tuple[Optional[str], Optional[int
     # Sanitize
     sanitized = str(invoice_no).strip()
     
+    # Single-line ASCII numbers split on their trailing digits without the regex
+    if sanitized.isascii() and "\n" not in sanitized:
+        prefix = sanitized.rstrip("0123456789")
+        digits = len(sanitized) - len(prefix)
+        if not digits:
+            return sanitized, None
+        if digits > 10:
+            prefix = sanitized[:-10]
+        return prefix, int(sanitized[len(prefix):])
+    
     # Try to match prefix + numeric suffix pattern
-    match = re.match(r'^(.*?)(\d{1,10})$', sanitized)
+    match = INVOICE_SERIAL_PATTERN.match(sanitized)
     if match:
         prefix = match.group(1)
         serial = int(match.group(2))
@@ -158,10 +228,10 @@ def detect_invoice_ranges(invoice_numbers: List[str]) -> List[Dict]:
     if not invoice_numbers:
         return []
     
-    # Group by prefix
+    # Group by prefix; lines of one invoice share its number, so parse each once
     prefix_groups: Dict[str, List[int]] = {}
     
-    for inv_no in invoice_numbers:
+    for inv_no in dict.fromkeys(invoice_numbers):
         prefix, serial = extract_invoice_serial(inv_no)
         if prefix and serial is not None:
             if prefix not in prefix_groups:
@@ -180,11 +250,12 @@ def detect_invoice_ranges(invoice_numbers: List[str]) -> List[Dict]:
         found_count = len(serials_sorted)
         expected_count = last - first + 1
         
-        # Find missing numbers
+        # Count gaps arithmetically; only the first 10 missing numbers are listed
+        missing_count = expected_count - found_count
         missing = []
-        for i in range(first, last + 1):
-            if i not in serials_sorted:
-                missing.append(i)
+        if missing_count:
+            serials_set = set(serials_sorted)
+            missing = list(islice((i for i in range(first, last + 1) if i not in serials_set), 10))
         
         ranges.append({
             "prefix": prefix,
@@ -194,8 +265,8 @@ def detect_invoice_ranges(invoice_numbers: List[str]) -> List[Dict]:
             "last_serial": last,
             "found_count": found_count,
             "expected_count": expected_count,
-            "missing_count": len(missing),
-            "missing_numbers": missing[:10]  # Limit to first 10 for display
+            "missing_count": missing_count,
+            "missing_numbers": missing
         })
     
     return ranges
@@ -230,21 +301,87 @@ def clean_numeric_value(value) -> Optional[float]:
         return None
 
 
+def clean_numeric_series(values: pd.Series) -> pd.Series:
+    """
+    Column-at-a-time clean_numeric_value; NaN marks cells that did not clean
+    
+    Numeric columns convert in a single cast. Text columns (currency signs,
+    Indian digit grouping) go cell by cell through clean_numeric_value, which
+    beats pandas string methods on object data.
+    """
+    if is_numeric_dtype(values.dtype):
+        result = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        result = np.fromiter(
+            (np.nan if (cleaned := clean_numeric_value(value)) is None else cleaned for value in values),
+            dtype=np.float64,
+            count=len(values)
+        )
+    return pd.Series(np.where(np.isfinite(result), result, np.nan), index=values.index)
+
+
+# Valid GST rates in India (hash lookup; None is never a member)
+VALID_GST_RATES = frozenset({0.0, 0.25, 3.0, 5.0, 12.0, 18.0, 28.0})
+
+
 def validate_gst_rate(rate: Optional[float]) -> bool:
     """Validate if GST rate is valid"""
-    if rate is None:
-        return False
-    
-    # Valid GST rates in India
-    valid_rates = [0, 0.25, 3, 5, 12, 18, 28]
-    return rate in valid_rates
+    return rate in VALID_GST_RATES
+
+
+# Amount fields summed per (state_code, gst_rate) group
+GROUP_AMOUNT_FIELDS = ("taxable_value", "cgst_amount", "sgst_amount", "igst_amount")
+
+
+def _round_half_up_2(values: np.ndarray) -> np.ndarray:
+    """Round to paise, half away from zero like Decimal ROUND_HALF_UP"""
+    # Snap float noise first so 1.005 (stored as 1.00499...) still rounds up
+    scaled = np.round(np.abs(values) * 100, 6)
+    return np.sign(values) * np.floor(scaled + 0.5) / 100
 
 
-def group_by_state_and_rate(invoice_lines: List[Dict]) -> Dict[Tuple[str, float], Dict]:
+def group_by_state_and_rate(invoice_lines: List[Dict], exact: bool = False) -> Dict[Tuple[str, float], Dict]:
     """
     Group invoice lines by state_code and gst_rate
     Returns aggregated data for each combination
+    
+    Sums are float64 groupby totals rounded once per group. Pass exact=True
+    to sum with Decimal instead, for audit exports that must match to the paisa.
     """
+    if exact:
+        return _group_by_state_and_rate_decimal(invoice_lines)
+    
+    # Same skip rule and missing-amount handling as the Decimal path; an
+    # unparseable amount raises instead of counting as zero
+    lines = [line for line in invoice_lines if line.get("state_code") and line.get("gst_rate") is not None]
+    if not lines:
+        return {}
+    
+    amounts = pd.DataFrame({
+        field: pd.to_numeric(pd.Series([line.get(field) or 0 for line in lines], dtype=object), errors="raise")
+        for field in GROUP_AMOUNT_FIELDS
+    })
+    amounts["count"] = 1
+    state_codes = pd.Series([line["state_code"] for line in lines])
+    gst_rates = pd.Series([line["gst_rate"] for line in lines])
+    totals = amounts.groupby([state_codes, gst_rates], sort=False, dropna=False).sum()
+    
+    groups: Dict[Tuple[str, float], Dict] = {}
+    rounded = {field: _round_half_up_2(totals[field].to_numpy(dtype=np.float64)) for field in GROUP_AMOUNT_FIELDS}
+    for i, (state_code, gst_rate) in enumerate(totals.index):
+        gst_rate = gst_rate.item() if isinstance(gst_rate, np.generic) else gst_rate
+        groups[(state_code, gst_rate)] = {
+            "state_code": state_code,
+            "gst_rate": gst_rate,
+            **{field: float(rounded[field][i]) for field in GROUP_AMOUNT_FIELDS},
+            "count": int(totals["count"].iat[i])
+        }
+    
+    return groups
+
+
+def _group_by_state_and_rate_decimal(invoice_lines: List[Dict]) -> Dict[Tuple[str, float], Dict]:
+    """Decimal-exact grouping behind group_by_state_and_rate(exact=True)"""
     groups: Dict[Tuple[str, float], Dict] = {}
     
     for line in invoice_lines:
@@ -256,29 +393,23 @@ def group_by_state_and_rate(invoice_lines: List[Dict]) -> Dict[Tuple[str, float]
         
         key = (state_code, gst_rate)
         
-        if key not in groups:
-            groups[key] = {
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
                 "state_code": state_code,
                 "gst_rate": gst_rate,
-                "taxable_value": Decimal("0"),
-                "cgst_amount": Decimal("0"),
-                "sgst_amount": Decimal("0"),
-                "igst_amount": Decimal("0"),
+                **{field: _ZERO for field in GROUP_AMOUNT_FIELDS},
                 "count": 0
             }
         
         # Aggregate using Decimal for precision
-        groups[key]["taxable_value"] += Decimal(str(line.get("taxable_value") or 0))
-        groups[key]["cgst_amount"] += Decimal(str(line.get("cgst_amount") or 0))
-        groups[key]["sgst_amount"] += Decimal(str(line.get("sgst_amount") or 0))
-        groups[key]["igst_amount"] += Decimal(str(line.get("igst_amount") or 0))
-        groups[key]["count"] += 1
+        for field in GROUP_AMOUNT_FIELDS:
+            group[field] += _to_decimal(line.get(field) or 0)
+        group["count"] += 1
     
     # Convert Decimal back to float with rounding
-    for key in groups:
-        groups[key]["taxable_value"] = float(groups[key]["taxable_value"].quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
-        groups[key]["cgst_amount"] = float(groups[key]["cgst_amount"].quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
-        groups[key]["sgst_amount"] = float(groups[key]["sgst_amount"].quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
-        groups[key]["igst_amount"] = float(groups[key]["igst_amount"].quantize(Decimal("0.01"), rounding=ROUND_HALF_UP))
+    for group in groups.values():
+        for field in GROUP_AMOUNT_FIELDS:
+            group[field] = float(group[field].quantize(_PAISA, rounding=ROUND_HALF_UP))
     
     return groups
@@ -2,9 +2,9 @@
 Verify that Supabase tables have been created
 """
 import os
+import asyncio
 from dotenv import load_dotenv
 from pathlib import Path
-from supabase import create_client
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -14,7 +14,8 @@ SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
 
 def verify_tables():
     """Check if all required tables exist"""
-    supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+    from supabase_client import get_supabase_client
+    supabase = get_supabase_client()
     
     tables = ['uploads', 'invoice_lines', 'gstr_exports']
     results = {}
@@ -24,15 +25,21 @@ def verify_tables():
     print("=" * 70)
     print()
     
-    for table in tables:
-        try:
-            # Try to query the table
-            result = supabase.table(table).select('*').limit(1).execute()
+    async def probe_all():
+        # Each probe is one blocking round trip; run them side by side
+        probes = (
+            asyncio.to_thread(supabase.table(table).select('id').limit(1).execute)
+            for table in tables
+        )
+        return await asyncio.gather(*probes, return_exceptions=True)
+    
+    for table, result in zip(tables, asyncio.run(probe_all())):
+        if not isinstance(result, Exception):
             results[table] = True
             print(f"✅ Table '{table}' exists and is accessible")
-        except Exception as e:
+        else:
             results[table] = False
-            error_msg = str(e)
+            error_msg = str(result)
             if 'PGRST205' in error_msg or 'not found' in error_msg.lower():
                 print(f"❌ Table '{table}' does not exist")
             else:
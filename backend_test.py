@@ -5,22 +5,67 @@ Tests the complete file upload and GSTR generation flow
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import json
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
 # Backend URL from frontend environment
 BACKEND_URL = "https://empty-results.preview.emergentagent.com/api"
 
+# Keys each endpoint's response must contain
+UPLOAD_REQUIRED = frozenset({'id', 'status', 'upload_date', 'files'})
+GSTR_REQUIRED = frozenset({'upload_id', 'gstr1b', 'gstr3b'})
+GSTR1B_TABLES = frozenset({'table_7', 'table_13', 'table_14'})
+GSTR3B_SECTIONS = frozenset({'section_3_1', 'section_3_2'})
+PROCESS_REQUIRED = frozenset({'upload_id', 'status', 'invoice_lines_count'})
+
+def parse_json(response):
+    """Decode a response body, with orjson when it is installed"""
+    if HAS_ORJSON:
+        return orjson.loads(response.content)
+    return response.json()
+
 class GSTBackendTester:
     def __init__(self):
         self.session = requests.Session()
         self.session.headers.update({
             'Content-Type': 'application/json',
-            'Accept': 'application/json'
+            'Accept': 'application/json',
+            'Connection': 'keep-alive'
         })
-        self.test_results = []
+        
+        # One persistent pool for every test; only idempotent requests are retried
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=20,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[502, 503, 504],
+                raise_on_status=False  # hand the last response back to the test
+            )
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        # (connect, read) seconds; processing and generation can run long
+        self.timeout = (3, 120)
+        
+        # Results go straight to disk; only the pass/fail counts stay in memory
+        self.results_path = "test_results.jsonl"
+        self._results_file = open(self.results_path, "w", buffering=1)
+        self.passed = 0
+        self.failed = 0
         
     def log_test(self, test_name, success, message, details=None):
         """Log test results"""
@@ -31,7 +76,11 @@ class GSTBackendTester:
             'details': details,
             'timestamp': datetime.now().isoformat()
         }
-        self.test_results.append(result)
+        self._results_file.write(json.dumps(result, default=str) + "\n")
+        if success:
+            self.passed += 1
+        else:
+            self.failed += 1
         
         status = "✅ PASS" if success else "❌ FAIL"
         print(f"{status} {test_name}: {message}")
@@ -41,10 +90,10 @@ class GSTBackendTester:
     def test_backend_health(self):
         """Test 1: Verify backend is running"""
         try:
-            response = self.session.get(f"{BACKEND_URL}/")
+            response = self.session.get(f"{BACKEND_URL}/", timeout=self.timeout)
             
             if response.status_code == 200:
-                data = response.json()
+                data = parse_json(response)
                 if "message" in data and "GST Filing Automation" in data["message"]:
                     self.log_test("Backend Health Check", True, 
                                 f"Backend is running. Version: {data.get('version', 'unknown')}")
@@ -66,10 +115,10 @@ class GSTBackendTester:
     def test_list_uploads(self):
         """Test 2: Check existing uploads"""
         try:
-            response = self.session.get(f"{BACKEND_URL}/uploads")
+            response = self.session.get(f"{BACKEND_URL}/uploads", timeout=self.timeout)
             
             if response.status_code == 200:
-                data = response.json()
+                data = parse_json(response)
                 uploads = data.get('uploads', [])
                 
                 self.log_test("List Uploads", True, 
@@ -90,14 +139,13 @@ class GSTBackendTester:
     def test_upload_details(self, upload_id):
         """Test 3: Get upload details"""
         try:
-            response = self.session.get(f"{BACKEND_URL}/upload/{upload_id}")
+            response = self.session.get(f"{BACKEND_URL}/upload/{upload_id}", timeout=self.timeout)
             
             if response.status_code == 200:
-                data = response.json()
+                data = parse_json(response)
                 
                 # Check required fields
-                required_fields = ['id', 'status', 'upload_date', 'files']
-                missing_fields = [field for field in required_fields if field not in data]
+                missing_fields = sorted(UPLOAD_REQUIRED - data.keys())
                 
                 if missing_fields:
                     self.log_test("Upload Details", False, 
@@ -121,14 +169,13 @@ class GSTBackendTester:
     def test_generate_gstr(self, upload_id):
         """Test 4: Generate GSTR files"""
         try:
-            response = self.session.post(f"{BACKEND_URL}/generate/{upload_id}")
+            response = self.session.post(f"{BACKEND_URL}/generate/{upload_id}", timeout=self.timeout)
             
             if response.status_code == 200:
-                data = response.json()
+                data = parse_json(response)
                 
                 # Check for required response structure
-                required_fields = ['upload_id', 'gstr1b', 'gstr3b']
-                missing_fields = [field for field in required_fields if field not in data]
+                missing_fields = sorted(GSTR_REQUIRED - data.keys())
                 
                 if missing_fields:
                     self.log_test("Generate GSTR", False, 
@@ -137,33 +184,25 @@ class GSTBackendTester:
                 
                 # Check GSTR1B structure
                 gstr1b = data.get('gstr1b', {})
-                gstr1b_tables = ['table_7', 'table_13', 'table_14']
-                gstr1b_missing = [table for table in gstr1b_tables if table not in gstr1b]
+                gstr1b_missing = sorted(GSTR1B_TABLES - gstr1b.keys())
                 
                 # Check GSTR3B structure
                 gstr3b = data.get('gstr3b', {})
-                gstr3b_sections = ['section_3_1', 'section_3_2']
-                gstr3b_missing = [section for section in gstr3b_sections if section not in gstr3b]
+                gstr3b_missing = sorted(GSTR3B_SECTIONS - gstr3b.keys())
                 
                 if gstr1b_missing or gstr3b_missing:
                     self.log_test("Generate GSTR", False, 
                                 f"Missing GSTR sections - GSTR1B: {gstr1b_missing}, GSTR3B: {gstr3b_missing}")
                     return None
                 
-                # Check for serialization errors
-                try:
-                    json.dumps(data)  # Test JSON serialization
-                    self.log_test("Generate GSTR", True, 
-                                f"Successfully generated GSTR files. Warnings: {len(data.get('validation_warnings', []))}")
-                    return data
-                except (TypeError, ValueError) as e:
-                    self.log_test("Generate GSTR", False, 
-                                f"JSON serialization error: {str(e)}")
-                    return None
+                # Decoding succeeding already proves the payload serialized cleanly
+                self.log_test("Generate GSTR", True, 
+                            f"Successfully generated GSTR files. Warnings: {len(data.get('validation_warnings', []))}")
+                return data
                 
             elif response.status_code == 400:
                 # Check if it's because upload needs processing first
-                error_detail = response.json().get('detail', response.text)
+                error_detail = parse_json(response).get('detail', response.text)
                 if "must be processed first" in error_detail:
                     self.log_test("Generate GSTR", False, 
                                 f"Upload needs processing first: {error_detail}")
@@ -185,13 +224,12 @@ class GSTBackendTester:
     def test_process_upload(self, upload_id):
         """Test 5: Process upload if needed"""
         try:
-            response = self.session.post(f"{BACKEND_URL}/process/{upload_id}")
+            response = self.session.post(f"{BACKEND_URL}/process/{upload_id}", timeout=self.timeout)
             
             if response.status_code == 200:
-                data = response.json()
+                data = parse_json(response)
                 
-                required_fields = ['upload_id', 'status', 'invoice_lines_count']
-                missing_fields = [field for field in required_fields if field not in data]
+                missing_fields = sorted(PROCESS_REQUIRED - data.keys())
                 
                 if missing_fields:
                     self.log_test("Process Upload", False, 
@@ -214,10 +252,10 @@ class GSTBackendTester:
     def test_downloads(self, upload_id):
         """Test 6: Check downloads availability"""
         try:
-            response = self.session.get(f"{BACKEND_URL}/downloads/{upload_id}")
+            response = self.session.get(f"{BACKEND_URL}/downloads/{upload_id}", timeout=self.timeout)
             
             if response.status_code == 200:
-                data = response.json()
+                data = parse_json(response)
                 exports = data.get('exports', [])
                 
                 self.log_test("Downloads Check", True, 
@@ -243,13 +281,17 @@ class GSTBackendTester:
         print("GST Filing Automation - Backend API Testing")
         print("=" * 60)
         
-        # Test 1: Backend Health
-        if not self.test_backend_health():
-            print("\n❌ Backend is not accessible. Stopping tests.")
-            return False
-        
-        # Test 2: List uploads
-        uploads = self.test_list_uploads()
+        # Tests 1 and 2 (backend health, list uploads) don't depend on each
+        # other, so both requests go out at once
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            health = pool.submit(self.test_backend_health)
+            listing = pool.submit(self.test_list_uploads)
+            
+            if not health.result():
+                print("\n❌ Backend is not accessible. Stopping tests.")
+                return False
+            
+            uploads = listing.result()
         
         if not uploads:
             print("\n⚠️  No existing uploads found. Cannot test upload processing flow.")
@@ -304,9 +346,9 @@ class GSTBackendTester:
         print("TEST SUMMARY")
         print("=" * 60)
         
-        total_tests = len(self.test_results)
-        passed_tests = sum(1 for result in self.test_results if result['success'])
-        failed_tests = total_tests - passed_tests
+        passed_tests = self.passed
+        failed_tests = self.failed
+        total_tests = passed_tests + failed_tests
         
         print(f"Total Tests: {total_tests}")
         print(f"Passed: {passed_tests}")
@@ -314,13 +356,20 @@ class GSTBackendTester:
         
         if failed_tests > 0:
             print("\n❌ FAILED TESTS:")
-            for result in self.test_results:
-                if not result['success']:
-                    print(f"  - {result['test']}: {result['message']}")
+            self._results_file.flush()
+            with open(self.results_path) as results:
+                for line in results:
+                    result = json.loads(line)
+                    if not result['success']:
+                        print(f"  - {result['test']}: {result['message']}")
         
         print(f"\n{'✅ ALL TESTS PASSED' if failed_tests == 0 else '❌ SOME TESTS FAILED'}")
         
         return failed_tests == 0
+    
+    def close(self):
+        """Close the results file"""
+        self._results_file.close()
 
 def main():
     """Main test execution"""
@@ -329,6 +378,7 @@ def main():
     try:
         success = tester.run_comprehensive_test()
         all_passed = tester.print_summary()
+        tester.close()
         
         # Exit with appropriate code
         sys.exit(0 if all_passed else 1)
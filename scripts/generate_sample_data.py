@@ -2,9 +2,12 @@
 """
 Generate sample Meesho export files for testing GST Automation
 """
+import io
+import zipfile
+
+import numpy as np
 import pandas as pd
 from pathlib import Path
-import random
 
 # Create test_data directory
 test_dir = Path("/app/test_data")
@@ -19,63 +22,71 @@ states = [
 # Valid GST rates
 gst_rates = [5, 12, 18, 28]
 
+rng = np.random.default_rng()
+
+
+def numbered(prefix, numbers, width=0):
+    """Vectorized f"{prefix}{n:0{width}d}" over an integer array"""
+    return np.char.add(prefix, np.char.zfill(numbers.astype(str), width))
+
+
+# Serialized workbooks, kept in memory for the ZIP archive
+sample_files = {}
+
+
+def write_xlsx(df, name):
+    """Serialize df once, write it to test_dir and keep the bytes for the ZIP"""
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False)
+    sample_files[name] = buf.getvalue()
+    (test_dir / name).write_bytes(sample_files[name])
+
+
 # Generate TCS Sales data
 print("Generating TCS Sales file...")
-tcs_sales_data = []
-for i in range(50):
-    tcs_sales_data.append({
-        "gst_rate": random.choice(gst_rates),
-        "total_taxable_sale_value": round(random.uniform(100, 5000), 2),
-        "end_customer_state_new": random.choice(states),
-        "order_id": f"ORD{1000 + i}",
-        "product_name": f"Product {i % 10 + 1}"
-    })
-
-tcs_sales_df = pd.DataFrame(tcs_sales_data)
-tcs_sales_df.to_excel(test_dir / "tcs_sales.xlsx", index=False)
-print(f"✓ Created tcs_sales.xlsx with {len(tcs_sales_data)} rows")
+idx = np.arange(50)
+tcs_sales_df = pd.DataFrame({
+    "gst_rate": rng.choice(gst_rates, size=len(idx)),
+    "total_taxable_sale_value": np.round(rng.uniform(100, 5000, len(idx)), 2),
+    "end_customer_state_new": rng.choice(states, size=len(idx)),
+    "order_id": numbered("ORD", 1000 + idx),
+    "product_name": numbered("Product ", idx % 10 + 1)
+})
+write_xlsx(tcs_sales_df, "tcs_sales.xlsx")
+print(f"✓ Created tcs_sales.xlsx with {len(tcs_sales_df)} rows")
 
 # Generate TCS Sales Return data
 print("Generating TCS Sales Return file...")
-tcs_returns_data = []
-for i in range(10):
-    tcs_returns_data.append({
-        "gst_rate": random.choice(gst_rates),
-        "total_taxable_sale_value": round(random.uniform(100, 2000), 2),
-        "end_customer_state_new": random.choice(states),
-        "order_id": f"RET{1000 + i}",
-        "product_name": f"Product {i % 5 + 1}"
-    })
-
-tcs_returns_df = pd.DataFrame(tcs_returns_data)
-tcs_returns_df.to_excel(test_dir / "tcs_sales_return.xlsx", index=False)
-print(f"✓ Created tcs_sales_return.xlsx with {len(tcs_returns_data)} rows")
+idx = np.arange(10)
+tcs_returns_df = pd.DataFrame({
+    "gst_rate": rng.choice(gst_rates, size=len(idx)),
+    "total_taxable_sale_value": np.round(rng.uniform(100, 2000, len(idx)), 2),
+    "end_customer_state_new": rng.choice(states, size=len(idx)),
+    "order_id": numbered("RET", 1000 + idx),
+    "product_name": numbered("Product ", idx % 5 + 1)
+})
+write_xlsx(tcs_returns_df, "tcs_sales_return.xlsx")
+print(f"✓ Created tcs_sales_return.xlsx with {len(tcs_returns_df)} rows")
 
 # Generate Tax Invoice Details
 print("Generating Tax Invoice Details file...")
-tax_invoice_data = []
-for i in range(60):
-    tax_invoice_data.append({
-        "Type": "Invoice",
-        "Invoice No.": f"INV-2025-{1001 + i:04d}",
-        "Invoice Date": f"2025-01-{(i % 28) + 1:02d}",
-        "Customer Name": f"Customer {i % 20 + 1}",
-        "Amount": round(random.uniform(500, 10000), 2)
-    })
-
-tax_invoice_df = pd.DataFrame(tax_invoice_data)
-tax_invoice_df.to_excel(test_dir / "Tax_invoice_details.xlsx", index=False)
-print(f"✓ Created Tax_invoice_details.xlsx with {len(tax_invoice_data)} rows")
+idx = np.arange(60)
+tax_invoice_df = pd.DataFrame({
+    "Type": "Invoice",
+    "Invoice No.": numbered("INV-2025-", 1001 + idx, 4),
+    "Invoice Date": numbered("2025-01-", idx % 28 + 1, 2),
+    "Customer Name": numbered("Customer ", idx % 20 + 1),
+    "Amount": np.round(rng.uniform(500, 10000, len(idx)), 2)
+})
+write_xlsx(tax_invoice_df, "Tax_invoice_details.xlsx")
+print(f"✓ Created Tax_invoice_details.xlsx with {len(tax_invoice_df)} rows")
 
 # Create a ZIP file with all the files
 print("\nCreating ZIP archive...")
-import zipfile
-
 zip_path = test_dir / "meesho_export_sample.zip"
-with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-    zipf.write(test_dir / "tcs_sales.xlsx", "tcs_sales.xlsx")
-    zipf.write(test_dir / "tcs_sales_return.xlsx", "tcs_sales_return.xlsx")
-    zipf.write(test_dir / "Tax_invoice_details.xlsx", "Tax_invoice_details.xlsx")
+with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as zipf:
+    for name, data in sample_files.items():
+        zipf.writestr(name, data)
 
 print(f"✓ Created meesho_export_sample.zip")
 
@@ -13,6 +13,7 @@ load_dotenv(ROOT_DIR / '.env')
 
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_KEY = os.environ.get('SUPABASE_KEY')
+EDITOR_URL = SUPABASE_URL.replace('.supabase.co', '.supabase.co/project/_/sql/new')
 
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
@@ -28,6 +29,6 @@ print(sql_schema)
 print("=" * 80)
 print("\nAfter running the SQL, your database will be ready!")
 print("\nTo access Supabase SQL Editor:")
-print(f"1. Go to: {SUPABASE_URL.replace('.supabase.co', '.supabase.co/project/_/sql/new')}")
+print(f"1. Go to: {EDITOR_URL}")
 print("2. Paste the SQL schema above")
 print("3. Click 'Run'")
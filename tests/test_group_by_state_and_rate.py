@@ -0,0 +1,84 @@
+import math
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from utils import _group_by_state_and_rate_decimal, group_by_state_and_rate  # noqa: E402
+
+
+def _normalized(groups):
+    """Groups as comparable rows; NaN rates and amounts compare equal to each other"""
+    def norm(value):
+        return "nan" if isinstance(value, float) and math.isnan(value) else value
+
+    return sorted(
+        (
+            (key[0], norm(key[1])),
+            tuple((field, norm(value)) for field, value in sorted(group.items())),
+        )
+        for key, group in groups.items()
+    )
+
+
+def _assert_parity(lines):
+    assert _normalized(group_by_state_and_rate(lines)) == _normalized(_group_by_state_and_rate_decimal(lines))
+
+
+def test_matches_decimal_on_random_lines():
+    rng = np.random.default_rng(0)
+    lines = [
+        {
+            "state_code": str(rng.choice(["27", "29", "07", "33"])),
+            "gst_rate": rng.choice([5, 12, 18.0, 28]).item(),
+            "taxable_value": round(float(rng.uniform(-500, 5000)), 2),
+            "cgst_amount": round(float(rng.uniform(0, 500)), 2),
+            "sgst_amount": round(float(rng.uniform(0, 500)), 2),
+            "igst_amount": round(float(rng.uniform(0, 900)), 2),
+        }
+        for _ in range(2000)
+    ]
+    _assert_parity(lines)
+
+
+def test_half_paisa_totals_round_half_up():
+    lines = [
+        {"state_code": "27", "gst_rate": 18, "taxable_value": 1.005, "cgst_amount": 0.125,
+         "sgst_amount": -0.125, "igst_amount": 0},
+    ]
+    _assert_parity(lines)
+    assert group_by_state_and_rate(lines)[("27", 18)]["taxable_value"] == 1.01
+
+
+def test_skip_rule_and_missing_amounts_match():
+    lines = [
+        {"state_code": "27", "gst_rate": 18, "taxable_value": None, "cgst_amount": "",
+         "sgst_amount": "12.50", "igst_amount": 0},
+        {"state_code": "27", "gst_rate": 18.0, "taxable_value": 100},
+        {"state_code": "", "gst_rate": 18, "taxable_value": 100},
+        {"state_code": None, "gst_rate": 18, "taxable_value": 100},
+        {"state_code": "29", "gst_rate": None, "taxable_value": 100},
+        {"state_code": "29", "gst_rate": 0, "taxable_value": 100},
+    ]
+    _assert_parity(lines)
+
+
+def test_nan_rate_is_kept_like_decimal_path():
+    lines = [{"state_code": "27", "gst_rate": float("nan"), "taxable_value": 100}]
+    assert len(group_by_state_and_rate(lines)) == 1
+    _assert_parity(lines)
+
+
+def test_unparseable_amount_raises_on_both_paths():
+    lines = [{"state_code": "27", "gst_rate": 18, "taxable_value": "abc"}]
+    with pytest.raises(ArithmeticError):
+        _group_by_state_and_rate_decimal(lines)
+    with pytest.raises(ValueError):
+        group_by_state_and_rate(lines)
+
+
+def test_empty_input():
+    assert group_by_state_and_rate([]) == {} == _group_by_state_and_rate_decimal([])
@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import parser_kernels  # noqa: E402
+from parser_kernels import compute_tax_split_bulk  # noqa: E402
+from utils import compute_tax_split  # noqa: E402
+
+FIELDS = ("tax_amount", "cgst_amount", "sgst_amount", "igst_amount")
+
+
+def _decimal_results(values, rates, intra):
+    return [
+        compute_tax_split(v, r, "29", "29" if i else "27")
+        for v, r, i in zip(values, rates, intra)
+    ]
+
+
+def _assert_matches(values, rates, intra):
+    bulk = compute_tax_split_bulk(np.array(values), np.array(rates), np.array(intra))
+    for row, expected in enumerate(_decimal_results(values, rates, intra)):
+        for field in FIELDS:
+            assert bulk[field][row] == expected[field], (values[row], rates[row], intra[row], field)
+
+
+def test_unrounded_taxable_value_is_not_pre_rounded():
+    # 100.4999 * 5% = 5.024995 -> 5.02; pre-rounding to 100.50 would give 5.03
+    bulk = compute_tax_split_bulk(np.array([100.4999]), np.array([5.0]), np.array([False]))
+    assert bulk["igst_amount"][0] == 5.02
+    _assert_matches([100.4999], [5.0], [False])
+
+
+@pytest.mark.parametrize("intra", [True, False])
+def test_bulk_matches_decimal_on_three_and_four_decimals(intra):
+    rng = np.random.default_rng(0)
+    values = np.concatenate([
+        np.round(rng.uniform(0, 10000, 500), 3),
+        np.round(rng.uniform(0, 10000, 500), 4),
+        [0.0, 0.005, 0.0049, 100.4999, 100.005, 2.0833, 999.9999],
+    ]).tolist()
+    rates = rng.choice([0.0, 0.1, 0.25, 3.0, 5.0, 12.0, 18.0, 28.0], size=len(values)).tolist()
+    _assert_matches(values, rates, [intra] * len(values))
+
+
+def test_numpy_fallback_matches_kernel():
+    rng = np.random.default_rng(1)
+    n = 1000
+    tv = np.rint(np.round(rng.uniform(0, 10000, n), 4) * parser_kernels.TV_SCALE).astype(np.int64)
+    rate = rng.choice([500, 1200, 1800, 2800], size=n).astype(np.int64)
+    intra = rng.random(n) < 0.5
+
+    outputs = []
+    for kernel in (parser_kernels._tax_split_kernel, parser_kernels._tax_split_numpy):
+        out = [np.empty(n, dtype=np.int64) for _ in range(4)]
+        kernel(tv, rate, intra, *out)
+        outputs.append(out)
+
+    for kernel_out, numpy_out in zip(*outputs):
+        np.testing.assert_array_equal(kernel_out, numpy_out)